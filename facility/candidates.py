@@ -0,0 +1,29 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Customers whose facility distances are computed at a time by the NumPy fallback
+CHUNK_ROWS = 512
+
+def nearest_facilities(facility_coords, customer_coords, k):
+    # Returns a (customer_count, k) array with the k nearest facilities of each customer, closest first
+    customer_count = len(customer_coords)
+    k = min(k, len(facility_coords))
+    if cKDTree is not None:
+        _, nearest = cKDTree(facility_coords).query(customer_coords, k)
+        return np.asarray(nearest, dtype=np.int64).reshape(customer_count, k)
+
+    nearest = np.empty((customer_count, k), dtype=np.int64)
+    for start in range(0, customer_count, CHUNK_ROWS):
+        stop = min(customer_count, start + CHUNK_ROWS)
+        block = ((customer_coords[start:stop, None, :] - facility_coords[None, :, :])**2).sum(axis=2)
+        closest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, closest, axis=1), axis=1)
+        nearest[start:stop] = np.take_along_axis(closest, order, axis=1)
+    return nearest
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Distances between two point sets (facilities by customers, or customers by facilities),
+# computed with NumPy broadcasting one block of rows at a time so the temporaries of a block stay
+# under a memory cap.
+
+# Bytes the temporaries of one block of rows may use
+CHUNK_MEMORY_LIMIT = 64 * 2**20
+# Largest matrix kept in double precision; larger ones are stored as float32
+MATRIX_MEMORY_LIMIT = 1024 * 2**20
+
+def coordinates(points):
+    # (n, 2) array of Point locations
+    return np.array([(point.x, point.y) for point in points], dtype=float).reshape(-1, 2)
+
+def distance_rows(row_coords, column_coords, memory_limit=CHUNK_MEMORY_LIMIT):
+    # Yields (first row, block of rows) pairs covering the whole matrix
+    row_count = len(row_coords)
+    # Each row needs three temporaries of len(column_coords) doubles: dx, dy and the result
+    rows = max(1, int(memory_limit // (3 * 8 * max(1, len(column_coords)))))
+    for start in range(0, row_count, rows):
+        stop = min(row_count, start + rows)
+        yield start, np.hypot(row_coords[start:stop, 0, None] - column_coords[None, :, 0],
+                              row_coords[start:stop, 1, None] - column_coords[None, :, 1])
+
+def distance_matrix(row_coords, column_coords, memory_limit=CHUNK_MEMORY_LIMIT):
+    # Full matrix filled block by block
+    shape = (len(row_coords), len(column_coords))
+    dtype = np.float64 if 8 * shape[0] * shape[1] <= MATRIX_MEMORY_LIMIT else np.float32
+    distances = np.empty(shape, dtype=dtype)
+    for start, block in distance_rows(row_coords, column_coords, memory_limit):
+        distances[start:start + len(block)] = block
+    return distances
+
+def assignment_distances(facility_coords, customer_coords, assignment):
+    # Distance from every customer to its assigned facility
+    located = facility_coords[np.asarray(assignment)]
+    return np.hypot(located[:, 0] - customer_coords[:, 0], located[:, 1] - customer_coords[:, 1])
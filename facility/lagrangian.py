@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+
+# Lagrangian relaxation of the capacitated facility location problem. The constraints that every
+# customer is served exactly once are moved into the objective with multipliers, which leaves one
+# knapsack per facility: serve the customers whose reduced cost c_ij - multiplier_j is negative,
+# within the capacity. The knapsacks are solved as LPs (fractional greedy), and the facilities are
+# opened subject to the aggregate constraint that the open capacity covers the total demand, so
+# every value of the relaxation is a valid lower bound. Subgradient steps tighten the bound and
+# the open facilities of the relaxation seed a repair heuristic that produces feasible solutions.
+
+# Subgradient iterations between two repairs
+REPAIR_INTERVAL = 5
+# Iterations without a better bound before the step scale is halved
+STALL_ITERATIONS = 10
+# Open capacity the repair provides, relative to the total demand; tight capacity forces
+# customers far away, so several levels are tried
+REPAIR_SLACKS = (1.0, 1.1, 1.2, 1.4)
+
+def _facility_knapsacks(distances, multipliers, demands, capacities):
+    # Value of every facility's fractional knapsack, and the fraction of every served customer
+    # as (facility, customer, fraction) arrays
+    rows, cols = np.nonzero(distances < multipliers[None, :])
+    profit = multipliers[cols] - distances[rows, cols]
+    weight = demands[cols]
+    order = np.lexsort((-profit / weight, rows))
+    rows, cols, profit, weight = rows[order], cols[order], profit[order], weight[order]
+    # Weight of the better items of the same facility
+    cumulative = np.cumsum(weight) - weight
+    first = np.searchsorted(rows, rows)
+    used_before = cumulative - cumulative[first]
+    taken = np.clip((capacities[rows] - used_before) / weight, 0.0, 1.0)
+    values = -np.bincount(rows, weights=profit * taken, minlength=len(capacities))
+    return values, (rows, cols, taken)
+
+def _open_facilities(values, capacities, total_demand):
+    # Fractional choice of facilities minimizing the total value with enough capacity
+    opened = (values < 0).astype(float)
+    missing = total_demand - capacities[values < 0].sum()
+    if missing > 0:
+        closed = np.flatnonzero(values >= 0)
+        closed = closed[np.argsort(values[closed] / capacities[closed], kind='stable')]
+        cumulative = np.cumsum(capacities[closed]) - capacities[closed]
+        opened[closed] = np.clip((missing - cumulative) / capacities[closed], 0.0, 1.0)
+    return opened
+
+def repair(distances, setup_costs, capacities, demands, open_mask, priority=None, slack=1.0):
+    # Feasible assignment that starts from the open facilities, topped up in priority order (by
+    # default setup cost per unit of capacity) to slack times the total demand. Customers with the
+    # largest regret between their two nearest open facilities go first, each to its nearest open
+    # facility with room; when none has room the facility with the cheapest setup plus distance
+    # is opened. Returns the assignment and its cost, or None if the demand cannot be served.
+    facility_count, customer_count = distances.shape
+    if capacities.sum() < demands.sum():
+        return None
+    if priority is None:
+        priority = setup_costs / capacities
+    open_mask = open_mask.copy()
+    missing = slack * demands.sum() - capacities[open_mask].sum()
+    if missing > 0:
+        closed = np.flatnonzero(~open_mask)
+        closed = closed[np.argsort(priority[closed], kind='stable')]
+        needed = np.searchsorted(np.cumsum(capacities[closed]), missing) + 1
+        open_mask[closed[:needed]] = True
+
+    open_rows = distances[open_mask]
+    if len(open_rows) > 1:
+        nearest = np.partition(open_rows, 1, axis=0)
+        order = np.argsort(nearest[0] - nearest[1], kind='stable')
+    else:
+        order = np.argsort(-demands, kind='stable')
+    remaining = np.where(open_mask, capacities, 0).astype(float)
+    assignment = np.zeros(customer_count, dtype=np.int64)
+    for j in order.tolist():
+        column = distances[:, j]
+        fits = remaining >= demands[j]
+        candidates = fits & open_mask
+        if candidates.any():
+            i = int(np.where(candidates, column, np.inf).argmin())
+        else:
+            closed = ~open_mask & (capacities >= demands[j])
+            if not closed.any():
+                return None
+            i = int(np.where(closed, setup_costs + column, np.inf).argmin())
+            open_mask[i] = True
+            remaining[i] = capacities[i]
+        assignment[j] = i
+        remaining[i] -= demands[j]
+    used = np.zeros(facility_count, dtype=bool)
+    used[assignment] = True
+    cost = setup_costs[used].sum() + distances[assignment, np.arange(customer_count)].sum()
+    return assignment, float(cost)
+
+def lagrangian_solution(setup_costs, capacities, demands, distances, time_limit_seconds=None,
+                        max_iterations=1000):
+    # Returns (assignment, cost, lower bound); assignment is None if no feasible solution exists
+    deadline = time.time() + time_limit_seconds if time_limit_seconds else None
+    setup_costs = np.asarray(setup_costs, dtype=float)
+    capacities = np.asarray(capacities, dtype=float)
+    demands = np.asarray(demands, dtype=float)
+    total_demand = demands.sum()
+
+    best = repair(distances, setup_costs, capacities, demands, np.zeros(len(setup_costs), dtype=bool))
+    if best is None:
+        return None, None, None
+    multipliers = distances.min(axis=0)
+    best_bound = -np.inf
+    step_scale = 0.5
+    stalled = 0
+    for iteration in range(max_iterations):
+        if deadline is not None and time.time() > deadline:
+            break
+        values, (rows, cols, taken) = _facility_knapsacks(distances, multipliers, demands, capacities)
+        opened = _open_facilities(setup_costs + values, capacities, total_demand)
+        bound = multipliers.sum() + ((setup_costs + values) * opened).sum()
+        if bound > best_bound + 1e-9:
+            best_bound = bound
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= STALL_ITERATIONS:
+                step_scale /= 2
+                stalled = 0
+                if step_scale < 1e-4:
+                    break
+
+        if iteration % REPAIR_INTERVAL == 0:
+            # Facilities with the best Lagrangian value per unit of capacity complete the open set
+            priority = (setup_costs + values) / capacities
+            for slack in REPAIR_SLACKS:
+                candidate = repair(distances, setup_costs, capacities, demands, opened > 0.5, priority, slack)
+                if candidate is not None and candidate[1] < best[1]:
+                    best = candidate
+        if best[1] <= best_bound + 1e-6 * abs(best_bound):
+            break
+
+        served = np.bincount(cols, weights=taken * opened[rows], minlength=len(demands))
+        subgradient = 1.0 - served
+        norm = float((subgradient * subgradient).sum())
+        if norm == 0:
+            break
+        multipliers = multipliers + step_scale * (best[1] - bound) / norm * subgradient
+    return best[0], best[1], float(best_bound)
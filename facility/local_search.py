@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+from candidates import nearest_facilities
+
+# Local search over the set of open facilities with open, close and swap (open one, close a nearby
+# one) moves, alternating with shift and swap moves of customers between the open facilities.
+# Every customer keeps its best and second best open facility, updated incrementally, which bounds
+# the cost of closing a facility before the capacity-respecting reassignment of its customers is
+# worked out.
+
+# Open facilities near a newly opened one that a swap may close
+SWAP_NEIGHBOR_COUNT = 10
+# Smallest change in cost that counts as an improvement
+EPSILON = 1e-6
+
+class _State(object):
+    # Assignment with cached loads, customer counts and distances; a facility is open while it
+    # serves at least one customer
+    def __init__(self, setup_costs, capacities, demands, distances, assignment):
+        self.setup_costs = setup_costs
+        self.capacities = capacities
+        self.demands = demands
+        self.distances = distances
+        facility_count, customer_count = distances.shape
+        self.customers = np.arange(customer_count)
+        self.assignment = np.array(assignment, dtype=np.int64)
+        self.assigned = distances[self.assignment, self.customers].astype(float)
+        self.loads = np.bincount(self.assignment, weights=demands, minlength=facility_count)
+        self.counts = np.bincount(self.assignment, minlength=facility_count)
+        self.open = self.counts > 0
+        self.best = np.zeros(customer_count, dtype=np.int64)
+        self.best_distance = np.zeros(customer_count)
+        self.second = np.zeros(customer_count, dtype=np.int64)
+        self.second_distance = np.zeros(customer_count)
+        self.refresh_nearest(self.customers)
+
+    def cost(self):
+        return float(self.setup_costs[self.open].sum() + self.assigned.sum())
+
+    def refresh_nearest(self, customers):
+        # Recomputes the best and second best open facility of the given customers
+        opened = np.flatnonzero(self.open)
+        block = self.distances[opened][:, customers]
+        if len(opened) == 1:
+            self.best[customers] = opened[0]
+            self.best_distance[customers] = block[0]
+            self.second[customers] = -1
+            self.second_distance[customers] = np.inf
+            return
+        top = np.argpartition(block, 1, axis=0)[:2]
+        top_distance = np.take_along_axis(block, top, axis=0)
+        swap = top_distance[1] < top_distance[0]
+        top[:, swap] = top[::-1, swap]
+        top_distance[:, swap] = top_distance[::-1, swap]
+        self.best[customers] = opened[top[0]]
+        self.best_distance[customers] = top_distance[0]
+        self.second[customers] = opened[top[1]]
+        self.second_distance[customers] = top_distance[1]
+
+    def _opened(self, i):
+        self.open[i] = True
+        row = self.distances[i]
+        closer = row < self.best_distance
+        between = ~closer & (row < self.second_distance)
+        self.second[closer] = self.best[closer]
+        self.second_distance[closer] = self.best_distance[closer]
+        self.best[closer] = i
+        self.best_distance[closer] = row[closer]
+        self.second[between] = i
+        self.second_distance[between] = row[between]
+
+    def _closed(self, i):
+        self.open[i] = False
+        self.refresh_nearest(np.flatnonzero((self.best == i) | (self.second == i)))
+
+    def move(self, customers, targets):
+        # Reassigns customers to targets, opening and closing facilities as their counts change
+        if len(customers) == 0:
+            return
+        sources = self.assignment[customers]
+        demands = self.demands[customers]
+        np.subtract.at(self.loads, sources, demands)
+        np.subtract.at(self.counts, sources, 1)
+        np.add.at(self.loads, targets, demands)
+        np.add.at(self.counts, targets, 1)
+        self.assignment[customers] = targets
+        self.assigned[customers] = self.distances[targets, customers]
+        for i in np.unique(targets).tolist():
+            if not self.open[i] and self.counts[i] > 0:
+                self._opened(i)
+        emptied = np.unique(sources)
+        for i in emptied[self.counts[emptied] == 0].tolist():
+            if self.open[i]:
+                self._closed(i)
+
+    def plan_open(self, i):
+        # Customers that move to facility i, nearest gains first while its capacity lasts, and the
+        # change in cost
+        gain = self.assigned - self.distances[i]
+        candidates = np.flatnonzero((gain > EPSILON) & (self.assignment != i))
+        if len(candidates) == 0:
+            return None, 0.0
+        candidates = candidates[np.argsort(-gain[candidates], kind='stable')]
+        room = self.capacities[i] - self.loads[i]
+        moved = candidates[np.cumsum(self.demands[candidates]) <= room]
+        if len(moved) == 0:
+            return None, 0.0
+        delta = -gain[moved].sum()
+        if not self.open[i]:
+            delta += self.setup_costs[i]
+        # Facilities left without customers no longer pay their setup cost
+        leaving = np.bincount(self.assignment[moved], minlength=len(self.capacities))
+        emptied = np.flatnonzero((leaving > 0) & (leaving == self.counts))
+        delta -= self.setup_costs[emptied].sum()
+        return moved, float(delta)
+
+    def _place(self, customers, available, remaining):
+        # Each customer in turn to its cheapest available facility with room, None if one does not fit
+        targets = np.empty(len(customers), dtype=np.int64)
+        for position, j in enumerate(customers.tolist()):
+            demand = self.demands[j]
+            fits = available & (remaining >= demand)
+            if not fits.any():
+                return None
+            target = int(np.where(fits, self.distances[:, j], np.inf).argmin())
+            targets[position] = target
+            remaining[target] -= demand
+        return targets
+
+    def plan_close(self, k):
+        # Capacity-respecting reassignment of the customers of facility k to the other open
+        # facilities, and the change in cost. Customers with the largest regret between their two
+        # cheapest alternatives are placed first; if they do not fit that way, the largest demands
+        # go first. None if the move cannot improve or the customers do not fit.
+        customers = np.flatnonzero(self.assignment == k)
+        alternative = np.where(self.best[customers] == k, self.second_distance[customers],
+                               self.best_distance[customers])
+        # Without capacities every customer would take its alternative: a lower bound on the change
+        if alternative.sum() - self.assigned[customers].sum() - self.setup_costs[k] > -EPSILON:
+            return None, None, 0.0
+        available = self.open.copy()
+        available[k] = False
+        others = np.flatnonzero(available)
+        if len(others) == 0:
+            return None, None, 0.0
+        if len(others) > 1:
+            block = np.partition(self.distances[others][:, customers], 1, axis=0)
+            regret = block[1] - block[0]
+        else:
+            regret = np.zeros(len(customers))
+        for priority in (regret, self.demands[customers]):
+            ordered = customers[np.argsort(-priority, kind='stable')]
+            targets = self._place(ordered, available, self.capacities - self.loads)
+            if targets is not None:
+                break
+        else:
+            return None, None, 0.0
+        delta = self.distances[targets, ordered].sum() - self.assigned[ordered].sum() - self.setup_costs[k]
+        return ordered, targets, float(delta)
+
+    def shift_customers(self):
+        # Moves single customers to a cheaper open facility with room, emptied facilities no longer
+        # paying their setup cost. Returns whether the cost went down.
+        opened = np.flatnonzero(self.open)
+        gain = self.assigned[None, :] - self.distances[opened]
+        gain[(self.capacities - self.loads)[opened, None] < self.demands[None, :]] = -np.inf
+        improving = np.flatnonzero(gain.max(axis=0) > EPSILON)
+        improved = False
+        for j in improving[np.argsort(-gain[:, improving].max(axis=0), kind='stable')].tolist():
+            source = self.assignment[j]
+            row = self.assigned[j] - self.distances[:, j]
+            row[~self.open | (self.capacities - self.loads < self.demands[j])] = -np.inf
+            row[source] = -np.inf
+            target = int(row.argmax())
+            if self.counts[source] == 1:
+                row[target] += self.setup_costs[source]
+            if row[target] > EPSILON:
+                self.move(np.array([j]), np.array([target]))
+                improved = True
+        return improved
+
+    def swap_customers(self):
+        # Exchanges two customers of different open facilities when both fit and the distance goes
+        # down; every customer tries the customers of the open facilities nearer than its own, at
+        # most SWAP_NEIGHBOR_COUNT of them. Returns whether the cost went down.
+        improved = False
+        for j in self.customers.tolist():
+            a = self.assignment[j]
+            column = self.distances[:, j]
+            nearer = np.flatnonzero(self.open & (column < self.assigned[j] - EPSILON))
+            if len(nearer) == 0:
+                continue
+            if len(nearer) > SWAP_NEIGHBOR_COUNT:
+                closest = np.argpartition(column[nearer], SWAP_NEIGHBOR_COUNT - 1)[:SWAP_NEIGHBOR_COUNT]
+                nearer = nearer[closest]
+            partners = np.flatnonzero(np.isin(self.assignment, nearer))
+            b = self.assignment[partners]
+            slack_a = self.capacities[a] - self.loads[a] + self.demands[j]
+            slack_b = self.capacities[b] - self.loads[b] + self.demands[partners]
+            gain = (self.assigned[j] + self.assigned[partners]
+                    - column[b] - self.distances[a, partners])
+            gain[(self.demands[partners] > slack_a) | (self.demands[j] > slack_b)] = -np.inf
+            if gain.max() <= EPSILON:
+                continue
+            best = int(gain.argmax())
+            self.move(np.array([j, partners[best]]), np.array([b[best], a]))
+            improved = True
+        return improved
+
+def improve_facilities(setup_costs, capacities, demands, distances, assignment, facility_coords=None,
+                       time_limit_seconds=None, seed=0):
+    # First-improvement descent over customer shift and swap moves and facility open, close and
+    # swap moves until no move improves or the time limit is reached. Returns the improved
+    # assignment and its cost.
+    deadline = time.time() + time_limit_seconds if time_limit_seconds else None
+    setup_costs = np.asarray(setup_costs, dtype=float)
+    capacities = np.asarray(capacities, dtype=float)
+    demands = np.asarray(demands, dtype=float)
+    state = _State(setup_costs, capacities, demands, distances, assignment)
+    facility_count = len(setup_costs)
+    neighbors = None
+    if facility_coords is not None and facility_count > 1:
+        neighbors = nearest_facilities(facility_coords, facility_coords, SWAP_NEIGHBOR_COUNT + 1)[:, 1:]
+    rng = np.random.RandomState(seed)
+
+    improved = True
+    while improved:
+        # Customer moves between the open facilities, then facility moves
+        improved = state.shift_customers()
+        improved = state.swap_customers() or improved
+        for i in rng.permutation(facility_count).tolist():
+            if deadline is not None and time.time() > deadline:
+                return state.assignment.tolist(), state.cost()
+            if state.open[i]:
+                customers, targets, delta = state.plan_close(i)
+                if customers is not None and delta < -EPSILON:
+                    state.move(customers, targets)
+                    improved = True
+                continue
+
+            moved, delta = state.plan_open(i)
+            if moved is None:
+                continue
+            if delta < -EPSILON:
+                state.move(moved, np.full(len(moved), i))
+                improved = True
+                continue
+            if neighbors is None:
+                continue
+            # Swap: open i, then close a nearby open facility; undone if the pair does not improve
+            previous = state.assignment[moved]
+            state.move(moved, np.full(len(moved), i))
+            swapped = False
+            for k in neighbors[i].tolist():
+                if not state.open[k] or k == i:
+                    continue
+                customers, targets, close_delta = state.plan_close(k)
+                if customers is not None and delta + close_delta < -EPSILON:
+                    state.move(customers, targets)
+                    swapped = True
+                    break
+            if swapped:
+                improved = True
+            else:
+                state.move(moved, previous)
+    return state.assignment.tolist(), state.cost()
@@ -1,43 +1,105 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import argparse
+import sys
+import time
 from collections import namedtuple
+import numpy as np
 from ortools.linear_solver import pywraplp
 import math
+from candidates import nearest_facilities
+from distances import assignment_distances, coordinates, distance_matrix
+from lagrangian import lagrangian_solution
+from local_search import improve_facilities
 
 Point = namedtuple("Point", ['x', 'y'])
 Facility = namedtuple("Facility", ['index', 'setup_cost', 'capacity', 'location'])
 Customer = namedtuple("Customer", ['index', 'demand', 'location'])
+SolverConfig = namedtuple("SolverConfig", ['mode', 'time_limit_seconds', 'neighbor_count'])
+
+# Largest instances solved with the dense MILP and with the MILP over nearest facilities by default
+DENSE_MIP_FACILITY_LIMIT = 100
+MIP_FACILITY_LIMIT = 250
+# Seconds the local search may spend improving a solution
+LOCAL_SEARCH_TIME_LIMIT = 60
+# Nearest facilities listed per customer by the greedy
+GREEDY_NEIGHBOR_COUNT = 10
+# Relative gap under which a solution is reported as optimal
+OPTIMALITY_TOLERANCE = 1e-6
+# Share of the sparse MILP's time limit spent on its Lagrangian incumbent
+INCUMBENT_TIME_SHARE = 0.1
 
 def length(point1, point2):
     return math.sqrt((point1.x - point2.x)**2 + (point1.y - point2.y)**2)
 
-def _greedy_solution(facilities, customers):
-    facility_count = len(facilities)
-    customer_count = len(customers)
-
-    # Build a greedy solution
-    solution = [-1]*len(customers)
-    used = [0]*len(facilities)
-    capacity_remaining = [f.capacity for f in facilities]
-
-    for customer in customers:
-        facility_index = 0
-        while capacity_remaining[facility_index] < customer.demand:
-            facility_index += 1
-        chosen_facility = facility_index
-        for j in range(facility_index+1, facility_count):
-            if capacity_remaining[j] >= customer.demand and \
-            length(facilities[j].location, customer.location) < length(facilities[chosen_facility].location, customer.location):
-                chosen_facility = j
-        solution[customer.index] = chosen_facility
-        capacity_remaining[chosen_facility] -= customer.demand
-        used[chosen_facility] = 1
+def facility_coordinates(facilities):
+    return coordinates([f.location for f in facilities])
+
+def customer_coordinates(customers):
+    return coordinates([c.location for c in customers])
+
+def create_distance_matrix(facilities, customers):
+    # Facility by customer distances, shared by every algorithm
+    return distance_matrix(facility_coordinates(facilities), customer_coordinates(customers))
+
+def solution_cost(facilities, customers, solution):
+    # Setup cost of the used facilities plus the distance of every customer to its facility
+    used = set(solution)
+    obj = sum(facilities[i].setup_cost for i in used)
+    return obj + float(assignment_distances(facility_coordinates(facilities), customer_coordinates(customers),
+                                            solution).sum())
+
+def improve_solution(facilities, customers, solution, distances=None):
+    # Open/close/swap local search from a feasible assignment; returns the assignment and its cost
+    if distances is None:
+        distances = create_distance_matrix(facilities, customers)
+    return improve_facilities([f.setup_cost for f in facilities], [f.capacity for f in facilities],
+                              [c.demand for c in customers], distances, solution,
+                              facility_coordinates(facilities), LOCAL_SEARCH_TIME_LIMIT)
+
+def greedy_orders(facility_coords, customer_coords, nearest):
+    # Customer orders tried by the greedy: input order, and largest regret first, the regret being
+    # the extra distance to the second nearest facility
+    index_order = np.arange(len(customer_coords))
+    if nearest.shape[1] < 2:
+        return [index_order]
+    nearest_distances = np.hypot(facility_coords[nearest[:, :2], 0] - customer_coords[:, 0, None],
+                                 facility_coords[nearest[:, :2], 1] - customer_coords[:, 1, None])
+    regret = nearest_distances[:, 1] - nearest_distances[:, 0]
+    return [index_order, np.argsort(-regret, kind='stable')]
+
+def greedy_assignment(facility_coords, customer_coords, demands, capacities, order, nearest):
+    # Every customer, in the given order, goes to its nearest facility with room. Each customer
+    # walks its sorted list of nearest facilities and only scans all facilities once the list is full.
+    capacity_remaining = np.array(capacities, dtype=float)
+    solution = [-1] * len(customer_coords)
+    for j in order.tolist():
+        demand = demands[j]
+        for i in nearest[j].tolist():
+            if capacity_remaining[i] >= demand:
+                break
+        else:
+            row = np.hypot(facility_coords[:, 0] - customer_coords[j, 0], facility_coords[:, 1] - customer_coords[j, 1])
+            i = int(np.where(capacity_remaining >= demand, row, np.inf).argmin())
+        solution[j] = i
+        capacity_remaining[i] -= demand
+    return solution
 
-    # calculate the cost of the solution
-    obj = sum([f.setup_cost*used[f.index] for f in facilities])
-    for customer in customers:
-        obj += length(customer.location, facilities[solution[customer.index]].location)
+def _greedy_solution(facilities, customers):
+    # Build a greedy solution in every customer order and keep the cheapest; the regret order
+    # wins on most large instances, the input order on some small ones
+    facility_coords = facility_coordinates(facilities)
+    customer_coords = customer_coordinates(customers)
+    demands = [c.demand for c in customers]
+    capacities = [f.capacity for f in facilities]
+    nearest = nearest_facilities(facility_coords, customer_coords, GREEDY_NEIGHBOR_COUNT)
+    solutions = [greedy_assignment(facility_coords, customer_coords, demands, capacities, order, nearest)
+                 for order in greedy_orders(facility_coords, customer_coords, nearest)]
+    solution = min(solutions, key=lambda candidate: solution_cost(facilities, customers, candidate))
+
+    # improve it with the local search, which also returns the cost of the solution
+    solution, obj = improve_solution(facilities, customers, solution)
 
     # prepare the solution in the specified output format
     output_data = '%.2f' % obj + ' ' + str(0) + '\n'
@@ -64,14 +126,8 @@ def _trivial_solution(facilities, customers):
             solution[customer.index] = facility_index
             capacity_remaining[facility_index] -= customer.demand
 
-    used = [0]*len(facilities)
-    for facility_index in solution:
-        used[facility_index] = 1
-
     # calculate the cost of the solution
-    obj = sum([f.setup_cost*used[f.index] for f in facilities])
-    for customer in customers:
-        obj += length(customer.location, facilities[solution[customer.index]].location)
+    obj = solution_cost(facilities, customers, solution)
 
     # prepare the solution in the specified output format
     output_data = '%.2f' % obj + ' ' + str(0) + '\n'
@@ -79,7 +135,129 @@ def _trivial_solution(facilities, customers):
 
     return output_data
 
-def solve_it(input_data):
+def _lagrangian_solution(facilities, customers, config):
+    distances = create_distance_matrix(facilities, customers)
+    solution, obj, lower_bound = lagrangian_solution(
+        [f.setup_cost for f in facilities], [f.capacity for f in facilities],
+        [c.demand for c in customers], distances, config.time_limit_seconds)
+    if solution is None:
+        return _trivial_solution(facilities, customers)
+    solution, obj = improve_solution(facilities, customers, solution, distances)
+    sys.stderr.write('lower bound %.2f, gap %.2f%%\n' % (lower_bound, 100 * (obj - lower_bound) / max(lower_bound, 1e-12)))
+    optimal = int(obj <= lower_bound * (1 + OPTIMALITY_TOLERANCE))
+
+    # prepare the solution in the specified output format
+    output_data = '%.2f' % obj + ' ' + str(optimal) + '\n'
+    output_data += ' '.join(map(str, solution))
+
+    return output_data
+
+def _solve_sparse_mip(facilities, customers, distances, candidates, big_m, time_limit_seconds):
+    # MILP with serve variables only for the candidate facilities of each customer, plus a
+    # continuous unserved variable per customer that costs big_m. Returns the assignment and the
+    # number of unserved customers, or None if the solver found no solution.
+    solver = pywraplp.Solver('Sparse MILP Solver', pywraplp.Solver.CBC_MIXED_INTEGER_PROGRAMMING)
+    solver.SetTimeLimit(int(1000 * time_limit_seconds))
+    objective = solver.Objective()
+
+    is_open_vars = []
+    capacity_constraints = []
+    for i, facility in enumerate(facilities):
+        is_open_vars.append(solver.IntVar(0.0, 1.0, 'open_{}'.format(i)))
+        objective.SetCoefficient(is_open_vars[i], facility.setup_cost)
+        constraint = solver.Constraint(-solver.infinity(), 0)
+        constraint.SetCoefficient(is_open_vars[i], -facility.capacity)
+        capacity_constraints.append(constraint)
+
+    is_serve_vars = []
+    for j, customer in enumerate(customers):
+        serve_constraint = solver.Constraint(1, 1)
+        unserved = solver.NumVar(0.0, 1.0, 'unserved_{}'.format(j))
+        serve_constraint.SetCoefficient(unserved, 1)
+        objective.SetCoefficient(unserved, big_m)
+        serve_vars = []
+        for i in candidates[j].tolist():
+            var = solver.IntVar(0.0, 1.0, 'serve_{}_{}'.format(i, j))
+            serve_vars.append((i, var))
+            serve_constraint.SetCoefficient(var, 1)
+            capacity_constraints[i].SetCoefficient(var, customer.demand)
+            objective.SetCoefficient(var, float(distances[i, j]))
+            # serve <= open, cheap once the model is sparse and much tighter in the LP relaxation
+            link = solver.Constraint(-solver.infinity(), 0)
+            link.SetCoefficient(var, 1)
+            link.SetCoefficient(is_open_vars[i], -1)
+        is_serve_vars.append(serve_vars)
+    objective.SetMinimization()
+    result_status = solver.Solve()
+
+    if not (result_status == pywraplp.Solver.OPTIMAL or result_status == pywraplp.Solver.FEASIBLE):
+        return None
+    solution = []
+    for serve_vars in is_serve_vars:
+        served = [i for i, var in serve_vars if var.solution_value() > 0.5]
+        solution.append(served[0] if served else -1)
+    return solution, solution.count(-1)
+
+def _sparse_mip_solution(facilities, customers, config):
+    # The MILP over each customer's nearest facilities and its facility in a Lagrangian incumbent,
+    # so the restricted model always contains the incumbent; the neighborhoods are doubled while
+    # the solution leaves customers unserved. All rounds share the time limit and the incumbent is
+    # kept when the MILP does not beat it.
+    deadline = time.time() + config.time_limit_seconds
+    distances = create_distance_matrix(facilities, customers)
+    facility_coords = facility_coordinates(facilities)
+    customer_coords = customer_coordinates(customers)
+    incumbent, obj, lower_bound = lagrangian_solution(
+        [f.setup_cost for f in facilities], [f.capacity for f in facilities],
+        [c.demand for c in customers], distances, INCUMBENT_TIME_SHARE * config.time_limit_seconds)
+    if incumbent is None:
+        return _trivial_solution(facilities, customers)
+    incumbent, obj = improve_solution(facilities, customers, incumbent, distances)
+    incumbent_facilities = np.array(incumbent)[:, None]
+
+    # More than opening and serving from any facility, so unserved customers are a last resort
+    big_m = max(f.setup_cost for f in facilities) + float(distances.max()) + 1
+    neighbor_count = config.neighbor_count
+    solution = None
+    optimal = obj <= lower_bound * (1 + OPTIMALITY_TOLERANCE)
+    while not optimal and time.time() < deadline:
+        nearest = nearest_facilities(facility_coords, customer_coords, neighbor_count)
+        candidates = [np.unique(row) for row in np.hstack([nearest, incumbent_facilities])]
+        result = _solve_sparse_mip(facilities, customers, distances, candidates, big_m, deadline - time.time())
+        if result is None:
+            break
+        if result[1] == 0:
+            solution = result[0]
+            break
+        if neighbor_count >= len(facilities):
+            break
+        neighbor_count *= 2
+
+    if solution is not None:
+        # The neighborhoods restrict the MILP, the local search may still find cheaper assignments
+        solution, sparse_obj = improve_solution(facilities, customers, solution, distances)
+        if sparse_obj < obj:
+            incumbent, obj = solution, sparse_obj
+    sys.stderr.write('lower bound %.2f, gap %.2f%%\n' % (lower_bound, 100 * (obj - lower_bound) / max(lower_bound, 1e-12)))
+    optimal = int(obj <= lower_bound * (1 + OPTIMALITY_TOLERANCE))
+
+    # prepare the solution in the specified output format
+    output_data = '%.2f' % obj + ' ' + str(optimal) + '\n'
+    output_data += ' '.join(map(str, incumbent))
+
+    return output_data
+
+def default_config(facility_count):
+    # The full MILP for small instances, the MILP over nearest facilities for medium ones and the
+    # Lagrangian heuristic for the others
+    if facility_count > MIP_FACILITY_LIMIT:
+        return SolverConfig(mode='lagrangian', time_limit_seconds=60, neighbor_count=20)
+    if facility_count > DENSE_MIP_FACILITY_LIMIT:
+        return SolverConfig(mode='sparse', time_limit_seconds=600, neighbor_count=20)
+    return SolverConfig(mode='mip', time_limit_seconds=5000, neighbor_count=20)
+
+def solve_it(input_data, **options):
+    # options override the fields of the default SolverConfig for this instance size
     # Modify this code to run your optimization algorithm
 
     # parse the input
@@ -99,12 +277,17 @@ def solve_it(input_data):
         parts = lines[i].split()
         customers.append(Customer(i-1-facility_count, int(parts[0]), Point(float(parts[1]), float(parts[2]))))
 
-    if facility_count > 250:
+    config = default_config(facility_count)._replace(**options)
+    if config.mode == 'greedy':
         return _greedy_solution(facilities, customers)
+    if config.mode == 'lagrangian':
+        return _lagrangian_solution(facilities, customers, config)
+    if config.mode == 'sparse':
+        return _sparse_mip_solution(facilities, customers, config)
 
     # Define MILP Model
     solver = pywraplp.Solver('MILP Solver', pywraplp.Solver.CBC_MIXED_INTEGER_PROGRAMMING)
-    solver.SetTimeLimit(5000000)
+    solver.SetTimeLimit(int(1000 * config.time_limit_seconds))
 
     # Define the decision variables
     is_open_vars = []
@@ -133,14 +316,16 @@ def solve_it(input_data):
     objective = solver.Objective()
     for i in range(facility_count):
         objective.SetCoefficient(is_open_vars[i], facilities[i].setup_cost)
+    distances = create_distance_matrix(facilities, customers).tolist()
     for i in range(facility_count):
         for j in range(customer_count):
-            objective.SetCoefficient(is_serve_vars[i][j], length(facilities[i].location, customers[j].location))
+            objective.SetCoefficient(is_serve_vars[i][j], distances[i][j])
     objective.SetMinimization()
     result_status = solver.Solve()
 
     if not (result_status == pywraplp.Solver.OPTIMAL or result_status == pywraplp.Solver.FEASIBLE):
-        return _trivial_solution(facilities, customers)
+        # No incumbent within the time limit
+        return _greedy_solution(facilities, customers)
 
     obj = solver.Objective().Value()
     solution = []
@@ -156,14 +341,26 @@ def solve_it(input_data):
     return output_data
 
 
+def parse_options(args):
+    # Command line flags map onto SolverConfig fields, unset flags keep the size-based defaults
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_location', nargs='?')
+    parser.add_argument('--mode', choices=['mip', 'sparse', 'lagrangian', 'greedy'])
+    parser.add_argument('--time-limit', dest='time_limit_seconds', type=float)
+    parser.add_argument('--neighbor-count', dest='neighbor_count', type=int)
+    parsed = vars(parser.parse_args(args))
+    file_location = parsed.pop('file_location')
+    return file_location, dict((key, value) for key, value in parsed.items() if value is not None)
+
 import sys
 
 if __name__ == '__main__':
     import sys
-    if len(sys.argv) > 1:
-        file_location = sys.argv[1].strip()
+    file_location, options = parse_options(sys.argv[1:])
+    if file_location:
+        file_location = file_location.strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print(solve_it(input_data))
+        print(solve_it(input_data, **options))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/fl_16_2)')
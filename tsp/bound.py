@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+from candidates import DisjointSet, nearest_neighbors
+from construction import randomized_nearest_neighbor
+from local_search import improve_tour
+from tour import tour_length
+
+# Held-Karp lower bound: minimum 1-trees under node penalties pi, maximized by subgradient
+# optimization. Iterations use the MST of a sparse candidate graph; the returned bound is
+# re-evaluated on the complete graph so it is always valid.
+
+# The 1-tree leaves this node out of the spanning tree and connects it with its two cheapest edges
+SPECIAL_NODE = 0
+# Tolerance when comparing a tour length against the bound
+OPTIMALITY_TOLERANCE = 1e-6
+
+def _dense_spanning_tree(coords, pi):
+    # Prim's algorithm on the complete graph without SPECIAL_NODE, O(n^2) time and O(n) memory.
+    # Returns the tree weight under penalties pi and the tree edges.
+    n = len(coords)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[SPECIAL_NODE] = True
+    best = np.full(n, np.inf)
+    parent = np.full(n, -1)
+    current = 1 if SPECIAL_NODE == 0 else 0
+    total = 0.0
+    edges = []
+    for _ in range(n - 2):
+        in_tree[current] = True
+        best[current] = np.inf
+        diff = coords - coords[current]
+        weight = np.hypot(diff[:, 0], diff[:, 1]) + pi + pi[current]
+        update = (weight < best) & ~in_tree
+        best[update] = weight[update]
+        parent[update] = current
+        current = int(best.argmin())
+        total += best[current]
+        edges.append((int(parent[current]), current))
+    return total, edges
+
+def _sparse_spanning_tree(pi, edge_from, edge_to, edge_length, node_count):
+    # Kruskal's algorithm on the candidate edges, None if they do not span the graph
+    weight = edge_length + pi[edge_from] + pi[edge_to]
+    components = DisjointSet(node_count)
+    total = 0.0
+    edges = []
+    for k in np.argsort(weight, kind='stable').tolist():
+        a = components.find(int(edge_from[k]))
+        b = components.find(int(edge_to[k]))
+        if a != b:
+            components.parent[a] = b
+            total += weight[k]
+            edges.append((int(edge_from[k]), int(edge_to[k])))
+            if len(edges) == node_count - 2:
+                return total, edges
+    return None
+
+def _one_tree(coords, pi, tree):
+    # Adds the two cheapest edges at SPECIAL_NODE to a spanning tree of the other nodes
+    total, edges = tree
+    diff = coords - coords[SPECIAL_NODE]
+    weight = np.hypot(diff[:, 0], diff[:, 1]) + pi + pi[SPECIAL_NODE]
+    weight[SPECIAL_NODE] = np.inf
+    closest = np.argpartition(weight, 1)[:2]
+    degree = np.zeros(len(coords), dtype=np.int64)
+    if edges:
+        np.add.at(degree, np.array(edges).ravel(), 1)
+    degree[closest] += 1
+    degree[SPECIAL_NODE] = 2
+    return total + weight[closest].sum() - 2 * pi.sum(), degree
+
+def held_karp_bound(coords, neighbors=None, upper_bound=None, max_iterations=300, time_limit_seconds=None):
+    n = len(coords)
+    if n < 3:
+        return 2 * float(np.hypot(*(coords[0] - coords[-1])))
+    deadline = time.time() + time_limit_seconds if time_limit_seconds else None
+    if neighbors is None:
+        neighbors = nearest_neighbors(coords, 10)
+    if upper_bound is None:
+        tour = randomized_nearest_neighbor(coords, neighbors, np.random.RandomState(0), greediness=1.0)
+        upper_bound = tour_length(coords, improve_tour(coords, tour, neighbors, time_limit_seconds))
+
+    # Candidate graph: neighbor lists plus the plain MST, which keeps it connected
+    pi = np.zeros(n)
+    _, mst_edges = _dense_spanning_tree(coords, pi)
+    candidate = set((min(a, b), max(a, b)) for a, b in mst_edges)
+    for a, row in enumerate(neighbors.tolist()):
+        if a != SPECIAL_NODE:
+            candidate.update((min(a, b), max(a, b)) for b in row if b != SPECIAL_NODE)
+    candidate = np.array(sorted(candidate))
+    edge_from, edge_to = candidate[:, 0], candidate[:, 1]
+    diff = coords[edge_from] - coords[edge_to]
+    edge_length = np.hypot(diff[:, 0], diff[:, 1])
+
+    best_bound = -np.inf
+    best_pi = pi.copy()
+    step_scale = 2.0
+    stalled = 0
+    for _ in range(max_iterations):
+        if deadline is not None and time.time() > deadline:
+            break
+        tree = _sparse_spanning_tree(pi, edge_from, edge_to, edge_length, n) or _dense_spanning_tree(coords, pi)
+        bound, degree = _one_tree(coords, pi, tree)
+        if bound > best_bound + 1e-9:
+            best_bound = bound
+            best_pi = pi.copy()
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= 10:
+                step_scale /= 2
+                stalled = 0
+                if step_scale < 1e-4:
+                    break
+        subgradient = degree - 2
+        norm = float((subgradient * subgradient).sum())
+        if norm == 0 or bound >= upper_bound:
+            # The 1-tree is a tour
+            break
+        pi = pi + step_scale * (upper_bound - bound) / norm * subgradient
+
+    # Evaluate the best penalties on the complete graph
+    return float(_one_tree(coords, best_pi, _dense_spanning_tree(coords, best_pi))[0])
+
+def is_optimal(obj, lower_bound):
+    return lower_bound is not None and obj <= lower_bound * (1 + OPTIMALITY_TOLERANCE)
+
+def optimality_gap(obj, lower_bound):
+    return (obj - lower_bound) / max(lower_bound, 1e-12)
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Rows of the pairwise distance block computed at a time by the NumPy fallback
+CHUNK_ROWS = 512
+
+def nearest_neighbors(coords, k):
+    # Returns an (n, k) array with the k nearest other nodes of each node, closest first
+    n = len(coords)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.zeros((n, 0), dtype=np.int64)
+    if cKDTree is not None:
+        _, neighbors = cKDTree(coords).query(coords, k + 1)
+        neighbors = np.asarray(neighbors, dtype=np.int64).reshape(n, k + 1)
+        # Drop the node itself; with duplicate points it is not necessarily in the first column
+        keep = neighbors != np.arange(n)[:, None]
+        keep[keep.sum(axis=1) > k, -1] = False
+        return neighbors[keep].reshape(n, k)
+
+    neighbors = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, CHUNK_ROWS):
+        stop = min(n, start + CHUNK_ROWS)
+        block = ((coords[start:stop, None, :] - coords[None, :, :])**2).sum(axis=2)
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(block, nearest, axis=1), axis=1)
+        neighbors[start:stop] = np.take_along_axis(nearest, order, axis=1)
+    return neighbors
+
+class DisjointSet(object):
+    # Union-find over 0..size-1 with path halving
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        self.parent[self.find(x)] = self.find(y)
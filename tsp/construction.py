@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+import numpy as np
+from candidates import nearest_neighbors
+
+def randomized_nearest_neighbor(coords, neighbors, rng, choices=3, greediness=0.7):
+    # Nearest neighbor tour from a random start; with probability 1 - greediness the next node is
+    # drawn among the few closest unvisited candidates instead of the closest one
+    n = len(coords)
+    neighbor_lists = neighbors.tolist()
+    visited = np.zeros(n, dtype=bool)
+    current = rng.randint(n)
+    visited[current] = True
+    tour = [current]
+    for _ in range(n - 1):
+        options = [c for c in neighbor_lists[current] if not visited[c]][:choices]
+        if options:
+            if rng.random_sample() < greediness:
+                current = options[0]
+            else:
+                current = options[rng.randint(len(options))]
+        else:
+            # Every candidate is taken, fall back to the closest unvisited node overall
+            unvisited = np.flatnonzero(~visited)
+            diff = coords[unvisited] - coords[current]
+            current = int(unvisited[np.hypot(diff[:, 0], diff[:, 1]).argmin()])
+        visited[current] = True
+        tour.append(current)
+    return tour
+
+def candidate_spanning_tree(coords, neighbors):
+    # Prim's algorithm with a heap over the candidate graph. When the candidates are exhausted the
+    # tree is extended to the unvisited node closest to the last node added.
+    n = len(coords)
+    neighbor_lists = neighbors.tolist()
+    in_tree = np.zeros(n, dtype=bool)
+    edges = []
+    heap = []
+    current = 0
+    in_tree[0] = True
+    while len(edges) < n - 1:
+        for c in neighbor_lists[current]:
+            if not in_tree[c]:
+                heapq.heappush(heap, (math.hypot(*(coords[current] - coords[c])), current, c))
+        while heap and in_tree[heap[0][2]]:
+            heapq.heappop(heap)
+        if heap:
+            _, a, current = heapq.heappop(heap)
+        else:
+            unvisited = np.flatnonzero(~in_tree)
+            diff = coords[unvisited] - coords[current]
+            a, current = current, int(unvisited[np.hypot(diff[:, 0], diff[:, 1]).argmin()])
+        in_tree[current] = True
+        edges.append((a, current))
+    return edges
+
+def greedy_matching(coords, nodes, k=10):
+    # Greedy perfect matching: shortest candidate pairs first, leftovers paired by nearest partner
+    nodes = np.asarray(nodes)
+    if len(nodes) == 0:
+        return []
+    local = coords[nodes]
+    near = nearest_neighbors(local, k)
+    pairs = []
+    for a, row in enumerate(near.tolist()):
+        pairs.extend((math.hypot(*(local[a] - local[b])), a, b) for b in row if a < b)
+    pairs.sort()
+    matched = np.zeros(len(nodes), dtype=bool)
+    matching = []
+    for _, a, b in pairs:
+        if not matched[a] and not matched[b]:
+            matched[a] = matched[b] = True
+            matching.append((int(nodes[a]), int(nodes[b])))
+    for a in range(len(nodes)):
+        if matched[a]:
+            continue
+        matched[a] = True
+        free = np.flatnonzero(~matched)
+        diff = local[free] - local[a]
+        b = int(free[np.hypot(diff[:, 0], diff[:, 1]).argmin()])
+        matched[b] = True
+        matching.append((int(nodes[a]), int(nodes[b])))
+    return matching
+
+def _euler_circuit(n, edges):
+    # Hierholzer's algorithm on the multigraph given by edges
+    adjacent = [[] for _ in range(n)]
+    for k, (a, b) in enumerate(edges):
+        adjacent[a].append((b, k))
+        adjacent[b].append((a, k))
+    used = [False] * len(edges)
+    stack = [edges[0][0]]
+    circuit = []
+    while stack:
+        node = stack[-1]
+        while adjacent[node] and used[adjacent[node][-1][1]]:
+            adjacent[node].pop()
+        if adjacent[node]:
+            other, k = adjacent[node].pop()
+            used[k] = True
+            stack.append(other)
+        else:
+            circuit.append(stack.pop())
+    return circuit
+
+def christofides_tour(coords, neighbors):
+    # Christofides-style construction: candidate-graph MST, greedy matching of the odd-degree
+    # nodes instead of a minimum one, Euler circuit, then shortcut repeated nodes
+    n = len(coords)
+    if n < 4:
+        return list(range(n))
+    tree = candidate_spanning_tree(coords, neighbors)
+    degree = np.zeros(n, dtype=np.int64)
+    np.add.at(degree, np.array(tree).ravel(), 1)
+    matching = greedy_matching(coords, np.flatnonzero(degree % 2 == 1))
+    seen = np.zeros(n, dtype=bool)
+    tour = []
+    for node in _euler_circuit(n, tree + matching):
+        if not seen[node]:
+            seen[node] = True
+            tour.append(node)
+    return tour
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+from tour import apply_or_opt, apply_two_opt, or_opt_deltas, two_opt_deltas
+
+# Target number of points per cluster
+CLUSTER_SIZE = 1000
+# Positions on each side of a seam that the seam repair is allowed to touch
+SEAM_WINDOW = 50
+# Longest segment moved by Or-opt during the seam repair
+MAX_SEGMENT = 3
+# Share of the time budget kept for the seam repair
+SEAM_TIME_SHARE = 0.1
+
+def grid_clusters(coords, cluster_size=CLUSTER_SIZE):
+    # Splits the points into vertical strips of equal size, then each strip into cells of equal size
+    strip_count = max(1, int(round(math.sqrt(len(coords) / float(cluster_size)))))
+    order = np.argsort(coords[:, 0], kind='stable')
+    clusters = []
+    for strip in np.array_split(order, strip_count):
+        strip = strip[np.argsort(coords[strip, 1], kind='stable')]
+        cell_count = max(1, int(math.ceil(len(strip) / float(cluster_size))))
+        clusters.extend(np.array_split(strip, cell_count))
+    return [cluster for cluster in clusters if len(cluster) > 0]
+
+def kmeans_clusters(coords, cluster_size=CLUSTER_SIZE, iterations=20, seed=0):
+    # Lloyd's algorithm on the coordinates, seeded with randomly chosen points
+    cluster_count = max(1, int(math.ceil(len(coords) / float(cluster_size))))
+    rng = np.random.RandomState(seed)
+    centroids = coords[rng.choice(len(coords), cluster_count, replace=False)]
+    labels = np.zeros(len(coords), dtype=np.int64)
+    for _ in range(iterations):
+        distances = ((coords[:, None, :] - centroids[None, :, :])**2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if _ > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for k in range(cluster_count):
+            members = coords[labels == k]
+            if len(members) > 0:
+                centroids[k] = members.mean(axis=0)
+    clusters = [np.flatnonzero(labels == k) for k in range(cluster_count)]
+    return [cluster for cluster in clusters if len(cluster) > 0]
+
+def _solve_cluster(route_solver, config, deadline, cluster_points):
+    # The route solver gets the cluster's time limit, cut to what is left before the deadline
+    time_limit = max(0.1, min(config.time_limit_seconds, deadline - time.time()))
+    tour = route_solver(cluster_points, config._replace(time_limit_seconds=time_limit))
+    if not tour:
+        tour = list(range(len(cluster_points)))
+    return tour
+
+def _open_cycle(coords, cycle, previous_point, next_point):
+    # Cuts one edge of a cluster cycle so the resulting path connects previous_point to next_point cheaply
+    cycle = np.asarray(cycle)
+    if len(cycle) == 1:
+        return cycle
+    here = coords[cycle]
+    entry_cost = np.hypot(*(here - previous_point).T)
+    exit_cost = np.hypot(*(here - next_point).T)
+    after = np.roll(np.arange(len(cycle)), -1)
+    edge = np.hypot(*(here - here[after]).T)
+    # Forward: enter at i + 1 and leave at i, dropping edge (i, i + 1)
+    forward = entry_cost[after] + exit_cost - edge
+    # Backward: enter at i and leave at i + 1, dropping the same edge
+    backward = entry_cost + exit_cost[after] - edge
+    i = int(forward.argmin())
+    j = int(backward.argmin())
+    if forward[i] <= backward[j]:
+        return np.roll(cycle, -(i + 1))
+    return np.roll(cycle[::-1], j + 1)
+
+def _repair_window(coords, tour, start, stop, deadline=None):
+    # First-improvement 2-opt and Or-opt restricted to positions start..stop; the tour outside the
+    # window is left in place, so later seam positions stay valid. Stops early once the deadline
+    # has passed. Returns the repaired tour.
+    start = max(0, start)
+    stop = min(len(tour) - 1, stop)
+    improved = True
+    while improved:
+        if deadline is not None and time.time() > deadline:
+            break
+        improved = False
+        for i in range(start, stop - 1):
+            j = np.arange(i + 2, stop + 1)
+            delta = two_opt_deltas(coords, tour, i, j)
+            k = int(delta.argmin())
+            if delta[k] < -1e-9:
+                apply_two_opt(tour, i, j[k])
+                improved = True
+        # Or-opt: move segments of up to MAX_SEGMENT nodes between two window positions
+        insert = np.arange(start, stop)
+        for seg_len in range(1, MAX_SEGMENT + 1):
+            for first in range(start + 1, stop - seg_len + 1):
+                for reverse in (False, True):
+                    delta = or_opt_deltas(coords, tour, first, seg_len, insert, reverse)
+                    k = int(delta.argmin())
+                    if delta[k] < -1e-9:
+                        tour = apply_or_opt(tour, first, seg_len, insert[k], reverse)
+                        improved = True
+    return tour
+
+def stitch_clusters(coords, clusters, cluster_tours, cluster_order):
+    # Joins the cluster tours in the order of the cluster-level tour and returns the tour and seam positions
+    centroids = np.array([coords[cluster].mean(axis=0) for cluster in clusters])
+    tour = []
+    seams = []
+    for position, k in enumerate(cluster_order):
+        previous_point = coords[tour[-1]] if tour else centroids[cluster_order[-1]]
+        next_point = centroids[cluster_order[(position + 1) % len(cluster_order)]]
+        cycle = clusters[k][cluster_tours[k]]
+        seams.append(len(tour))
+        tour.extend(_open_cycle(coords, cycle, previous_point, next_point).tolist())
+    return tour, seams
+
+def solve_decomposed(points, route_solver, config):
+    # Divide and conquer: cluster the points, solve each cluster in parallel and stitch the tours.
+    # The time budget covers the clustering, the cluster solves and the seam repair.
+    budget = config.time_limit_seconds or 300
+    deadline = time.time() + budget
+    coords = np.array(points, dtype=float)
+    cluster_size = config.cluster_size or CLUSTER_SIZE
+    if config.cluster_method == 'grid':
+        clusters = grid_clusters(coords, cluster_size)
+    else:
+        clusters = kmeans_clusters(coords, cluster_size)
+
+    # Each worker gets an equal share of what the clustering left of the budget, the tour over the
+    # centroids one more share, and no solve runs into the time kept for the seam repair
+    solve_deadline = deadline - SEAM_TIME_SHARE * budget
+    workers = config.workers or os.cpu_count() or 1
+    rounds = int(math.ceil(len(clusters) / float(workers)))
+    cluster_config = config._replace(time_limit_seconds=max(0.1, solve_deadline - time.time()) / (rounds + 1))
+    solve_cluster = partial(_solve_cluster, route_solver, cluster_config, solve_deadline)
+    cluster_points = [[points[i] for i in cluster] for cluster in clusters]
+    if workers > 1:
+        pool = Pool(processes=workers)
+        try:
+            cluster_tours = pool.map(solve_cluster, cluster_points)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        cluster_tours = [solve_cluster(p) for p in cluster_points]
+
+    # Visit the clusters in the order of a tour over their centroids
+    centroids = [tuple(coords[cluster].mean(axis=0)) for cluster in clusters]
+    cluster_order = _solve_cluster(route_solver, cluster_config, solve_deadline,
+                                   [points[0]._make(c) for c in centroids])
+
+    tour, seams = stitch_clusters(coords, clusters, cluster_tours, cluster_order)
+
+    # Repair the seams between consecutive clusters with local 2-opt and Or-opt
+    tour = np.array(tour)
+    for seam in seams:
+        if time.time() > deadline:
+            break
+        tour = _repair_window(coords, tour, seam - SEAM_WINDOW, seam + SEAM_WINDOW, deadline)
+    return tour.tolist()
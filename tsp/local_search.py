@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import time
+from collections import deque
+
+# Longest segment moved by Or-opt
+MAX_SEGMENT = 3
+
+def improve_tour(coords, tour, neighbors, time_limit_seconds=None):
+    # 2-opt and Or-opt over neighbor lists. Nodes whose edges changed are queued again
+    # (don't-look bits), so the search only revisits the parts of the tour that moved.
+    deadline = time.time() + time_limit_seconds if time_limit_seconds else None
+    xs = coords[:, 0].tolist()
+    ys = coords[:, 1].tolist()
+    neighbor_lists = neighbors.tolist()
+    tour = list(tour)
+    n = len(tour)
+    if n < 5:
+        return tour
+    pos = [0] * n
+    for i, node in enumerate(tour):
+        pos[node] = i
+
+    def dist(a, b):
+        return math.hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    def reverse(i, j):
+        # Reverses tour positions i..j (cyclic); the complement is reversed instead when shorter
+        i %= n
+        j %= n
+        inner = (j - i) % n + 1
+        if 2 * inner > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            inner = n - inner
+        for _ in range(inner // 2):
+            a = tour[i]
+            b = tour[j]
+            tour[i] = b
+            pos[b] = i
+            tour[j] = a
+            pos[a] = j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def two_opt(a):
+        for forward in (True, False):
+            i = pos[a]
+            a_next = tour[(i + 1) % n] if forward else tour[(i - 1) % n]
+            d_a = dist(a, a_next)
+            for c in neighbor_lists[a]:
+                gain = d_a - dist(a, c)
+                if gain <= 0:
+                    break
+                j = pos[c]
+                c_next = tour[(j + 1) % n] if forward else tour[(j - 1) % n]
+                if c_next == a or c == a_next:
+                    continue
+                if dist(a_next, c_next) - dist(c, c_next) - gain < -1e-10:
+                    if forward:
+                        reverse(i + 1, j)
+                    else:
+                        reverse(j, i - 1)
+                    return (a, a_next, c, c_next)
+        return None
+
+    def or_opt(a):
+        i = pos[a]
+        for seg_len in range(1, MAX_SEGMENT + 1):
+            last = tour[(i + seg_len - 1) % n]
+            prev_node = tour[(i - 1) % n]
+            next_node = tour[(i + seg_len) % n]
+            if next_node == prev_node or seg_len + 2 > n:
+                break
+            segment = set(tour[(i + k) % n] for k in range(seg_len))
+            removed = dist(prev_node, a) + dist(last, next_node) - dist(prev_node, next_node)
+            if removed <= 1e-10:
+                continue
+            for end in (a, last):
+                for c in neighbor_lists[end]:
+                    if dist(end, c) >= removed:
+                        break
+                    if c in segment:
+                        continue
+                    for u, v in ((c, tour[(pos[c] + 1) % n]), (tour[(pos[c] - 1) % n], c)):
+                        if u in segment or v in segment:
+                            continue
+                        d_uv = dist(u, v)
+                        forward = dist(u, a) + dist(last, v) - d_uv
+                        backward = dist(u, last) + dist(a, v) - d_uv
+                        if min(forward, backward) < removed - 1e-10:
+                            move_segment(i, seg_len, u, backward < forward)
+                            return (prev_node, next_node, a, last, u, v)
+        return None
+
+    def move_segment(i, seg_len, u, reverse_segment):
+        # Moves the segment at positions i..i+seg_len-1 right after node u
+        rotated = tour[i:] + tour[:i]
+        segment = rotated[:seg_len]
+        rest = rotated[seg_len:]
+        if reverse_segment:
+            segment.reverse()
+        at = rest.index(u) + 1
+        tour[:] = rest[:at] + segment + rest[at:]
+        for k, node in enumerate(tour):
+            pos[node] = k
+
+    queue = deque(tour)
+    queued = [True] * n
+    while queue:
+        if deadline is not None and time.time() > deadline:
+            break
+        a = queue.popleft()
+        queued[a] = False
+        touched = two_opt(a) or or_opt(a)
+        if touched:
+            for node in touched:
+                if not queued[node]:
+                    queued[node] = True
+                    queue.append(node)
+    return tour
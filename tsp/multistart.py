@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+from candidates import DisjointSet, nearest_neighbors
+from construction import randomized_nearest_neighbor
+from local_search import improve_tour
+from tour import as_coords, tour_length
+
+# Share of the time budget spent on the independent runs, the rest goes to merging
+RUN_TIME_SHARE = 0.8
+
+def _tour_edges(tour):
+    return set((min(a, b), max(a, b)) for a, b in zip(tour, tour[1:] + tour[:1]))
+
+def merge_tours(coords, tours, neighbors):
+    # Greedy assembly on the union graph: edges common to every tour are kept, then the remaining
+    # union edges are added shortest first, then fragments are joined through candidate edges
+    # and finally by nearest free endpoint
+    n = len(coords)
+    degree = [0] * n
+    adjacent = [[] for _ in range(n)]
+    components = DisjointSet(n)
+
+    def dist(a, b):
+        return math.hypot(coords[a, 0] - coords[b, 0], coords[a, 1] - coords[b, 1])
+
+    def try_add(a, b):
+        if a == b or degree[a] >= 2 or degree[b] >= 2 or components.find(a) == components.find(b):
+            return False
+        degree[a] += 1
+        degree[b] += 1
+        adjacent[a].append(b)
+        adjacent[b].append(a)
+        components.union(a, b)
+        return True
+
+    edge_sets = [_tour_edges(list(tour)) for tour in tours]
+    common = set.intersection(*edge_sets)
+    union = set.union(*edge_sets) - common
+    for a, b in sorted(common, key=lambda edge: dist(*edge)):
+        try_add(a, b)
+    for a, b in sorted(union, key=lambda edge: dist(*edge)):
+        try_add(a, b)
+    candidate_edges = set()
+    for a in range(n):
+        if degree[a] < 2:
+            candidate_edges.update((min(a, b), max(a, b)) for b in neighbors[a] if degree[b] < 2)
+    for a, b in sorted(candidate_edges, key=lambda edge: dist(*edge)):
+        try_add(a, b)
+
+    # Chain the remaining fragments, always walking to the nearest free endpoint
+    fragment_ends = {}
+    for a in range(n):
+        if degree[a] < 2:
+            fragment_ends.setdefault(components.find(a), []).append(a)
+    other_end = {}
+    for ends in fragment_ends.values():
+        other_end[ends[0]] = ends[-1]
+        other_end[ends[-1]] = ends[0]
+    free = np.array(sorted(other_end))
+    slot = dict((a, k) for k, a in enumerate(free))
+    alive = np.ones(len(free), dtype=bool)
+    current = other_end[free[0]]
+    alive[slot[free[0]]] = alive[slot[current]] = False
+    while alive.any():
+        candidates = free[alive]
+        diff = coords[candidates] - coords[current]
+        nearest = int(candidates[np.hypot(diff[:, 0], diff[:, 1]).argmin()])
+        try_add(current, nearest)
+        current = other_end[nearest]
+        alive[slot[nearest]] = alive[slot[current]] = False
+
+    # Close the Hamiltonian path and read the tour off the adjacency lists
+    ends = [a for a in range(n) if degree[a] < 2]
+    start = ends[0]
+    tour = [start]
+    previous = None
+    while len(tour) < n:
+        step = [b for b in adjacent[tour[-1]] if b != previous]
+        previous = tour[-1]
+        tour.append(step[0])
+    return tour
+
+def _randomized_run(coords, neighbors, time_limit_seconds, seed):
+    rng = np.random.RandomState(seed)
+    tour = randomized_nearest_neighbor(coords, neighbors, rng)
+    return improve_tour(coords, tour, neighbors, time_limit_seconds)
+
+def solve_multistart(points, config):
+    # Independent randomized constructions + local search in a process pool, recombined by merge_tours
+    start_time = time.time()
+    coords = as_coords(points)
+    if len(coords) < 5:
+        return list(range(len(coords)))
+    neighbors = nearest_neighbors(coords, config.neighbor_count)
+    time_limit = config.time_limit_seconds or 300
+
+    workers = config.workers or os.cpu_count() or 1
+    rounds = int(math.ceil(config.starts / float(workers)))
+    run_time = RUN_TIME_SHARE * time_limit / rounds
+    run = partial(_randomized_run, coords, neighbors, run_time)
+    seeds = list(range(config.starts))
+    if workers > 1:
+        pool = Pool(processes=workers)
+        try:
+            tours = pool.map(run, seeds)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        tours = [run(seed) for seed in seeds]
+
+    best = min(tours, key=lambda tour: tour_length(coords, tour))
+    remaining = max(1.0, time_limit - (time.time() - start_time))
+    merged = improve_tour(coords, merge_tours(coords, tours, neighbors), neighbors, remaining)
+    if tour_length(coords, merged) < tour_length(coords, best):
+        return merged
+    return best
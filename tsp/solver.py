@@ -1,23 +1,229 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import argparse
 import math
+import sys
+import time
 from collections import namedtuple
+import numpy as np
 from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
+from ortools.util import optional_boolean_pb2
+from bound import OPTIMALITY_TOLERANCE, held_karp_bound, is_optimal, optimality_gap
+from candidates import nearest_neighbors
+from construction import christofides_tour, randomized_nearest_neighbor
+from decompose import solve_decomposed
+from local_search import improve_tour
+from multistart import solve_multistart
+from tour import as_coords, tour_length
 
 Point = namedtuple("Point", ['x', 'y'])
+SolverConfig = namedtuple("SolverConfig", ['mode', 'time_limit_seconds', 'first_solution_strategy',
+                                           'metaheuristic', 'lns_time_limit_ms', 'lns_operators',
+                                           'cluster_size', 'cluster_method', 'workers',
+                                           'starts', 'neighbor_count', 'lower_bound', 'warm_start'])
+
+# OR-Tools works with integer arc costs, so distances are scaled before truncation
+DISTANCE_SCALE = 100
+# Above this size a full n x n matrix costs too much memory to hand over to OR-Tools
+MATRIX_NODE_LIMIT = 2500
+# Share of the time limit spent on the lower bound, and its limit when the search has none
+BOUND_TIME_SHARE = 0.1
+BOUND_TIME_LIMIT = 10
+# Share of the time limit spent on the local search of the warm start tour
+WARM_START_TIME_SHARE = 0.2
 
 def length(point1, point2):
     return math.sqrt((point1.x - point2.x)**2 + (point1.y - point2.y)**2)
 
-def create_distance_callback(points):
-    def distance_callback(from_node, to_node):
-        return int(100 * length(points[from_node], points[to_node]))
+def create_distance_matrix(points):
+    # Integer distance matrix computed with broadcasting
+    coords = np.array(points, dtype=float)
+    dx = coords[:, 0, None] - coords[None, :, 0]
+    dy = coords[:, 1, None] - coords[None, :, 1]
+    return (DISTANCE_SCALE * np.hypot(dx, dy)).astype(np.int64)
+
+def create_distance_callback(manager, points):
+    xs = [p.x for p in points]
+    ys = [p.y for p in points]
+
+    def distance_callback(from_index, to_index):
+        from_node = manager.IndexToNode(from_index)
+        to_node = manager.IndexToNode(to_index)
+        return int(DISTANCE_SCALE * math.hypot(xs[from_node] - xs[to_node], ys[from_node] - ys[to_node]))
 
     return distance_callback
 
-def solve_it(input_data):
+def register_distance(routing, manager, points):
+    # Matrix transits are evaluated natively; the callback is only used when the matrix is too big
+    if len(points) <= MATRIX_NODE_LIMIT:
+        return routing.RegisterTransitMatrix(create_distance_matrix(points).tolist())
+    return routing.RegisterTransitCallback(create_distance_callback(manager, points))
+
+def default_config(node_count):
+    # Search settings scaled by the instance size
+    config = SolverConfig(mode='routing', time_limit_seconds=int(min(300, max(30, node_count // 5))),
+                          first_solution_strategy='PATH_CHEAPEST_ARC',
+                          metaheuristic='GUIDED_LOCAL_SEARCH', lns_time_limit_ms=100,
+                          lns_operators=(), cluster_size=1000, cluster_method='kmeans',
+                          workers=None, starts=8, neighbor_count=10, lower_bound=True,
+                          warm_start='christofides')
+    if node_count > 50000:
+        # Too large for one routing model, each cluster gets guided local search instead
+        return config._replace(mode='decompose', time_limit_seconds=300, lower_bound=False)
+    if node_count > 10000:
+        # A full routing model is too heavy, restrict the arcs to nearest neighbors
+        return config._replace(mode='sparse', time_limit_seconds=300, lower_bound=False)
+    if node_count >= 5000:
+        # Guided local search does not pay off here, stop at the first local optimum
+        return config._replace(time_limit_seconds=None, metaheuristic='GREEDY_DESCENT')
+    return config
+
+def create_search_parameters(config):
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        getattr(routing_enums_pb2.FirstSolutionStrategy, config.first_solution_strategy))
+    search_parameters.local_search_metaheuristic = (
+        getattr(routing_enums_pb2.LocalSearchMetaheuristic, config.metaheuristic))
+    if config.time_limit_seconds:
+        search_parameters.time_limit.FromMilliseconds(int(1000 * config.time_limit_seconds))
+    search_parameters.lns_time_limit.FromMilliseconds(config.lns_time_limit_ms)
+    for operator in config.lns_operators:
+        setattr(search_parameters.local_search_operators, 'use_' + operator,
+                optional_boolean_pb2.BOOL_TRUE)
+    return search_parameters
+
+def add_bound_stop(routing, manager, points, lower_bound):
+    # Ends the search as soon as a solution meets the lower bound
+    coords = as_coords(points)
+    scaled_bound = DISTANCE_SCALE * lower_bound * (1 + OPTIMALITY_TOLERANCE)
+
+    def stop_at_bound():
+        # Truncated arc costs never exceed the scaled length, so only walk candidate tours
+        if routing.CostVar().Value() > scaled_bound:
+            return
+        tour = []
+        index = routing.Start(0)
+        while not routing.IsEnd(index):
+            tour.append(manager.IndexToNode(index))
+            index = routing.NextVar(index).Value()
+        if is_optimal(tour_length(coords, tour), lower_bound):
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(stop_at_bound)
+
+def build_initial_tour(coords, neighbors, method, time_limit_seconds=None):
+    # Constructs a tour and improves it with 2-opt/Or-opt; the tour starts at the depot node 0
+    if method == 'christofides':
+        tour = christofides_tour(coords, neighbors)
+    else:
+        tour = randomized_nearest_neighbor(coords, neighbors, np.random.RandomState(0), greediness=1.0)
+    tour = improve_tour(coords, tour, neighbors, time_limit_seconds)
+    depot_position = tour.index(0)
+    return tour[depot_position:] + tour[:depot_position]
+
+def warm_start_time(config):
+    # Seconds the warm start's local search may spend, None when the search has no time limit
+    if not config.time_limit_seconds:
+        return None
+    return WARM_START_TIME_SHARE * config.time_limit_seconds
+
+def remaining_config(config, start_time):
+    # The config with the time spent since start_time taken off its time limit
+    if not config.time_limit_seconds:
+        return config
+    return config._replace(time_limit_seconds=max(0.1, config.time_limit_seconds - (time.time() - start_time)))
+
+def solve_from_tour(routing, manager, search_parameters, initial):
+    # Starts the search from the given tour instead of building a first solution
+    routing.CloseModelWithParameters(search_parameters)
+    initial_assignment = routing.ReadAssignmentFromRoutes([initial[1:]], True)
+    if not initial_assignment:
+        return None
+    return routing.SolveFromAssignmentWithParameters(initial_assignment, search_parameters)
+
+def read_tour(routing, manager, assignment):
+    results = []
+    route_number = 0
+    index = routing.Start(route_number) # Index of the variable for the starting node.
+    while not routing.IsEnd(index):
+        results.append(manager.IndexToNode(index))
+        index = assignment.Value(routing.NextVar(index))
+    return results
+
+def solve_routing(points, config, lower_bound=None):
+    # Solves the TSP over points with OR-Tools and returns the visiting order, or None. Building
+    # the model and the warm start count against the time limit.
+    start_time = time.time()
+    if len(points) <= 3:
+        return list(range(len(points)))
+
+    # Declare the solver
+    manager = pywrapcp.RoutingIndexManager(len(points), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    # Register the distances as the arc cost.
+    transit_callback_index = register_distance(routing, manager, points)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    if lower_bound is not None:
+        add_bound_stop(routing, manager, points, lower_bound)
+
+    # Solve the problem, from a constructed tour when a warm start is configured.
+    if config.warm_start != 'none':
+        coords = as_coords(points)
+        initial = build_initial_tour(coords, nearest_neighbors(coords, config.neighbor_count), config.warm_start,
+                                     warm_start_time(config))
+        search_parameters = create_search_parameters(remaining_config(config, start_time))
+        assignment = solve_from_tour(routing, manager, search_parameters, initial)
+        if not assignment:
+            return initial
+    else:
+        assignment = routing.SolveWithParameters(create_search_parameters(remaining_config(config, start_time)))
+    if not assignment:
+        return None
+    return read_tour(routing, manager, assignment)
+
+def restrict_next_domains(routing, manager, neighbors, fallback_successors):
+    # Each node may only be followed by its nearest neighbors, its fallback successor or the route end
+    end_index = routing.End(0)
+    for node, row in enumerate(neighbors.tolist()):
+        allowed = set(manager.NodeToIndex(c) for c in row if c != 0)
+        allowed.add(manager.NodeToIndex(fallback_successors[node]) if fallback_successors[node] != 0 else end_index)
+        allowed.add(end_index)
+        routing.NextVar(manager.NodeToIndex(node)).SetValues(sorted(allowed))
+
+def solve_sparse_routing(points, config, lower_bound=None):
+    # OR-Tools over a sparse arc set so the model stays O(n k) on instances too large for
+    # solve_routing. Building the model and the warm start count against the time limit.
+    start_time = time.time()
+    coords = as_coords(points)
+    if len(points) <= 3:
+        return list(range(len(points)))
+    neighbors = nearest_neighbors(coords, config.neighbor_count)
+
+    # A quick local search tour seeds the search and provides the fallback arcs
+    initial = build_initial_tour(coords, neighbors, config.warm_start, warm_start_time(config))
+    fallback_successors = [0] * len(points)
+    for a, b in zip(initial, initial[1:] + initial[:1]):
+        fallback_successors[a] = b
+
+    manager = pywrapcp.RoutingIndexManager(len(points), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    transit_callback_index = register_distance(routing, manager, points)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    if lower_bound is not None:
+        add_bound_stop(routing, manager, points, lower_bound)
+    restrict_next_domains(routing, manager, neighbors, fallback_successors)
+
+    assignment = solve_from_tour(routing, manager, create_search_parameters(remaining_config(config, start_time)),
+                                 initial)
+    if not assignment:
+        return initial
+    return read_tour(routing, manager, assignment)
+
+def solve_it(input_data, **options):
+    # options override the fields of the default SolverConfig for this instance size
     # Modify this code to run your optimization algorithm
 
     # parse the input
@@ -31,56 +237,78 @@ def solve_it(input_data):
         parts = line.split()
         points.append(Point(float(parts[0]), float(parts[1])))
 
-    # If the problem size is too large, use trivial solution
-    if len(points) > 10000:
-        solution = range(0, nodeCount)
-        obj = length(points[solution[-1]], points[solution[0]])
-        for index in range(0, nodeCount-1):
-            obj += length(points[solution[index]], points[solution[index+1]])
-        output_data = '%.2f' % obj + ' ' + str(0) + '\n'
-        output_data += ' '.join(map(str, solution))
-        return output_data
+    config = default_config(nodeCount)._replace(**options)
+    coords = as_coords(points)
+
+    # The bound lets the routing search stop once a tour is provably optimal
+    lower_bound = None
+    if config.lower_bound:
+        bound_start = time.time()
+        bound_time = BOUND_TIME_SHARE * config.time_limit_seconds if config.time_limit_seconds else BOUND_TIME_LIMIT
+        lower_bound = held_karp_bound(coords, nearest_neighbors(coords, config.neighbor_count),
+                                      time_limit_seconds=bound_time)
+        if config.time_limit_seconds:
+            # The search gets what the bound left of the time limit
+            spent = time.time() - bound_start
+            config = config._replace(time_limit_seconds=max(1, config.time_limit_seconds - spent))
+
+    if config.mode == 'decompose':
+        solution = solve_decomposed(points, solve_routing, config)
+    elif config.mode == 'sparse':
+        solution = solve_sparse_routing(points, config, lower_bound)
+    elif config.mode == 'multistart':
+        solution = solve_multistart(points, config)
+    else:
+        solution = solve_routing(points, config, lower_bound)
+
+    if not solution:
+        # No search produced a tour; the input order is still a valid answer
+        solution = list(range(nodeCount))
+
+    obj = tour_length(coords, solution)
+    optimal = 0
+    if lower_bound is not None:
+        sys.stderr.write('lower bound %.2f, gap %.2f%%\n' % (lower_bound, 100 * optimality_gap(obj, lower_bound)))
+        optimal = int(is_optimal(obj, lower_bound))
+    output_data = '%.2f' % obj + ' ' + str(optimal) + '\n'
+    output_data += ' '.join(map(str, solution))
+    return output_data
+
+def parse_options(args):
+    # Command line flags map onto SolverConfig fields, unset flags keep the size-based defaults
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_location', nargs='?')
+    parser.add_argument('--mode', choices=['routing', 'sparse', 'decompose', 'multistart'])
+    parser.add_argument('--time-limit', dest='time_limit_seconds', type=float)
+    parser.add_argument('--first-solution', dest='first_solution_strategy',
+                        choices=routing_enums_pb2.FirstSolutionStrategy.Value.keys())
+    parser.add_argument('--metaheuristic',
+                        choices=routing_enums_pb2.LocalSearchMetaheuristic.Value.keys())
+    parser.add_argument('--lns-time-limit-ms', dest='lns_time_limit_ms', type=int)
+    parser.add_argument('--lns-operators', dest='lns_operators',
+                        type=lambda value: tuple(filter(None, value.split(','))),
+                        help='comma separated, e.g. path_lns,tsp_lns')
+    parser.add_argument('--cluster-size', dest='cluster_size', type=int)
+    parser.add_argument('--cluster-method', dest='cluster_method', choices=['kmeans', 'grid'])
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--starts', type=int)
+    parser.add_argument('--neighbor-count', dest='neighbor_count', type=int)
+    parser.add_argument('--lower-bound', dest='lower_bound', action='store_true', default=None)
+    parser.add_argument('--no-lower-bound', dest='lower_bound', action='store_false')
+    parser.add_argument('--warm-start', dest='warm_start', choices=['christofides', 'nearest_neighbor', 'none'])
+    parsed = vars(parser.parse_args(args))
+    file_location = parsed.pop('file_location')
+    return file_location, dict((key, value) for key, value in parsed.items() if value is not None)
 
-    # Declare the solver
-    routing = pywrapcp.RoutingModel(len(points), 1, 0)
-    search_parameters = pywrapcp.RoutingModel.DefaultSearchParameters()
-
-    # If the problem size is small, use guided local search
-    if len(points) < 5000:
-        search_parameters.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-        search_parameters.time_limit_ms = 300000
-
-    # Create the distance callback.
-    dist_callback = create_distance_callback(points)
-    routing.SetArcCostEvaluatorOfAllVehicles(dist_callback)
-
-    # Solve the problem.
-    assignment = routing.SolveWithParameters(search_parameters)
-
-    if assignment:
-        results = []
-        route_number = 0
-        index = routing.Start(route_number) # Index of the variable for the starting node.
-        while not routing.IsEnd(index):
-            results.append(index)
-            index = assignment.Value(routing.NextVar(index))
-
-        obj = 0.0
-        for i in range(1, len(results)):
-            obj += length(points[results[i-1]], points[results[i]])
-        obj += length(points[results[-1]], points[0])
-        output_data = '%.2f' % obj + ' ' + str(0) + '\n'
-        output_data += ' '.join(map(str, results))
-        return output_data
 import sys
 
 if __name__ == '__main__':
     import sys
-    if len(sys.argv) > 1:
-        file_location = sys.argv[1].strip()
+    file_location, options = parse_options(sys.argv[1:])
+    if file_location:
+        file_location = file_location.strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print(solve_it(input_data))
+        print(solve_it(input_data, **options))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/tsp_51_1)')
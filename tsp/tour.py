@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Vectorized tour kernels. Tours are arrays of node indices into coords, an (n, 2) float array,
+# and every tour is closed (the last node connects back to the first).
+
+def as_coords(points):
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+def _dist(coords, a, b):
+    diff = coords[a] - coords[b]
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+def edge_lengths(coords, tour):
+    # Length of edge (tour[i], tour[i + 1]) for every position i
+    tour = np.asarray(tour)
+    return _dist(coords, tour, np.roll(tour, -1))
+
+def tour_length(coords, tour):
+    return float(edge_lengths(coords, tour).sum())
+
+def validate_tour(tour, node_count):
+    # Raises ValueError unless tour visits every node exactly once
+    tour = np.asarray(tour)
+    if tour.shape != (node_count,):
+        raise ValueError('tour has {} nodes, expected {}'.format(tour.size, node_count))
+    if tour.min() < 0 or tour.max() >= node_count:
+        raise ValueError('tour contains nodes outside 0..{}'.format(node_count - 1))
+    seen = np.bincount(tour, minlength=node_count)
+    if (seen != 1).any():
+        raise ValueError('node {} is visited {} times'.format(int(np.flatnonzero(seen != 1)[0]),
+                                                              int(seen[seen != 1][0])))
+
+def two_opt_deltas(coords, tour, i, j):
+    # Change in length for reversing tour[i + 1:j + 1], for arrays of positions i < j.
+    # Removes edges (t[i], t[i + 1]) and (t[j], t[j + 1]), adds (t[i], t[j]) and (t[i + 1], t[j + 1]).
+    tour = np.asarray(tour)
+    n = len(tour)
+    i = np.asarray(i)
+    j = np.asarray(j)
+    a = tour[i]
+    b = tour[(i + 1) % n]
+    c = tour[j]
+    d = tour[(j + 1) % n]
+    return _dist(coords, a, c) + _dist(coords, b, d) - _dist(coords, a, b) - _dist(coords, c, d)
+
+def apply_two_opt(tour, i, j):
+    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+    return tour
+
+def or_opt_deltas(coords, tour, start, seg_len, insert, reverse=False):
+    # Change in length for moving segment tour[start:start + seg_len] between tour[insert] and
+    # tour[insert + 1], optionally reversed. Positions where insert touches the segment give inf.
+    tour = np.asarray(tour)
+    n = len(tour)
+    start = np.asarray(start)
+    seg_len = np.asarray(seg_len)
+    insert = np.asarray(insert)
+    prev_node = tour[(start - 1) % n]
+    first = tour[start % n]
+    last = tour[(start + seg_len - 1) % n]
+    next_node = tour[(start + seg_len) % n]
+    a = tour[insert % n]
+    b = tour[(insert + 1) % n]
+    removed = _dist(coords, prev_node, first) + _dist(coords, last, next_node) - _dist(coords, prev_node, next_node)
+    if reverse:
+        added = _dist(coords, a, last) + _dist(coords, first, b) - _dist(coords, a, b)
+    else:
+        added = _dist(coords, a, first) + _dist(coords, last, b) - _dist(coords, a, b)
+    delta = added - removed
+    # insert must lie outside [start - 1, start + seg_len - 1] (cyclically)
+    offset = (insert - start + 1) % n
+    return np.where(offset <= seg_len, np.inf, delta)
+
+def apply_or_opt(tour, start, seg_len, insert, reverse=False):
+    # Returns a new tour with the segment moved; start + seg_len must not wrap around the end
+    tour = np.asarray(tour)
+    segment = tour[start:start + seg_len]
+    if reverse:
+        segment = segment[::-1]
+    rest = np.concatenate((tour[:start], tour[start + seg_len:]))
+    node = tour[insert]
+    position = int(np.flatnonzero(rest == node)[0]) + 1
+    return np.concatenate((rest[:position], segment, rest[position:]))
@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys
+from tour import as_coords, tour_length, validate_tour
+
+def parse_points(input_data):
+    lines = input_data.split('\n')
+    node_count = int(lines[0])
+    return as_coords([[float(part) for part in lines[i].split()] for i in range(1, node_count + 1)])
+
+def check_solution(input_data, output_data, tolerance=0.01):
+    # Returns the recomputed tour length, raising ValueError if the solution is invalid
+    coords = parse_points(input_data)
+    lines = output_data.strip().split('\n')
+    claimed = float(lines[0].split()[0])
+    tour = [int(node) for node in lines[1].split()]
+    validate_tour(tour, len(coords))
+    obj = tour_length(coords, tour)
+    if abs(obj - claimed) > tolerance + 1e-9 * obj:
+        raise ValueError('reported objective {} but the tour has length {:.2f}'.format(claimed, obj))
+    return obj
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        with open(sys.argv[1].strip(), 'r') as input_data_file:
+            input_data = input_data_file.read()
+        with open(sys.argv[2].strip(), 'r') as output_data_file:
+            output_data = output_data_file.read()
+        print('%.2f' % check_solution(input_data, output_data))
+    else:
+        print('Usage: python validator.py ./data/tsp_51_1 solution.txt  (solution in the solver output format)')
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+import numpy as np
+from savings import savings_routes
+from local_search import customer_neighbors
+
+# Target number of customers per cluster
+CLUSTER_SIZE = 100
+
+def sweep_clusters(coords, demands, cluster_count):
+    # Sorts the customers by polar angle around the depot and cuts the sweep into arcs of equal demand
+    customers = np.arange(1, len(coords))
+    angle = np.arctan2(coords[1:, 1] - coords[0, 1], coords[1:, 0] - coords[0, 0])
+    order = customers[np.argsort(angle, kind='stable')]
+    load = np.cumsum(np.asarray(demands, dtype=float)[order])
+    cuts = np.searchsorted(load, load[-1] * np.arange(1, cluster_count) / cluster_count)
+    clusters = np.split(order, cuts)
+    return [cluster for cluster in clusters if len(cluster) > 0]
+
+def kmeans_clusters(coords, cluster_count, iterations=20, seed=0):
+    # Lloyd's algorithm on the customer coordinates, seeded with randomly chosen customers
+    points = coords[1:]
+    rng = np.random.RandomState(seed)
+    centroids = points[rng.choice(len(points), cluster_count, replace=False)]
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centroids[None, :, :])**2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if _ > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for k in range(cluster_count):
+            members = points[labels == k]
+            if len(members) > 0:
+                centroids[k] = members.mean(axis=0)
+    clusters = [np.flatnonzero(labels == k) + 1 for k in range(cluster_count)]
+    return [cluster for cluster in clusters if len(cluster) > 0]
+
+def allocate_vehicles(cluster_demands, capacity, vehicle_count):
+    # Every cluster gets the vehicles its demand needs, the spare ones go by largest remainder of
+    # the demand share. None if the clusters need more vehicles than the fleet has.
+    cluster_demands = np.asarray(cluster_demands, dtype=float)
+    needed = np.ceil(cluster_demands / capacity).astype(np.int64)
+    spare = vehicle_count - needed.sum()
+    if spare < 0:
+        return None
+    share = spare * cluster_demands / cluster_demands.sum()
+    vehicles = needed + np.floor(share).astype(np.int64)
+    remainder = share - np.floor(share)
+    for k in np.argsort(-remainder, kind='stable')[:vehicle_count - vehicles.sum()]:
+        vehicles[k] += 1
+    return vehicles.tolist()
+
+def _solve_cluster(route_solver, config, capacity, deadline, subproblem):
+    # Routes of one cluster in local indices (0 is the depot), None if none were found. The route
+    # solver gets the cluster's time limit, cut to what is left before the deadline; once the
+    # deadline has passed the savings routes are returned as they are.
+    customers, vehicle_count, distances = subproblem
+    demands = [customer.demand for customer in customers]
+    initial_routes = savings_routes(distances, demands, capacity, vehicle_count, customer_neighbors(distances))
+    time_limit = min(config.time_limit_seconds, deadline - time.time())
+    if time_limit <= 0 and initial_routes is not None:
+        return initial_routes
+    routes = route_solver(customers, vehicle_count, capacity, distances,
+                          config._replace(time_limit_seconds=max(0.1, time_limit)), initial_routes)
+    return routes if routes is not None else initial_routes
+
+def solve_decomposed(customers, vehicle_count, vehicle_capacity, distances, route_solver, config):
+    # Divide and conquer: cluster the customers, give every cluster its share of the fleet, solve
+    # the clusters in parallel and concatenate their routes. None if some cluster has no solution.
+    coords = np.array([(customer.x, customer.y) for customer in customers], dtype=float)
+    demands = [customer.demand for customer in customers]
+    cluster_size = config.cluster_size or CLUSTER_SIZE
+    cluster_count = max(1, min(vehicle_count, int(math.ceil((len(customers) - 1) / float(cluster_size)))))
+    if config.cluster_method == 'kmeans':
+        clusters = kmeans_clusters(coords, cluster_count)
+    else:
+        clusters = sweep_clusters(coords, demands, cluster_count)
+    vehicles = allocate_vehicles([sum(demands[c] for c in cluster) for cluster in clusters],
+                                 vehicle_capacity, vehicle_count)
+    if vehicles is None:
+        return None
+
+    subproblems = []
+    nodes = []
+    for cluster, cluster_vehicles in zip(clusters, vehicles):
+        cluster_nodes = [0] + cluster.tolist()
+        nodes.append(cluster_nodes)
+        subproblems.append(([customers[i] for i in cluster_nodes], cluster_vehicles,
+                            distances[np.ix_(cluster_nodes, cluster_nodes)]))
+
+    # Each worker gets an equal share of the time budget, and no cluster runs past its end
+    budget = config.time_limit_seconds or 300
+    deadline = time.time() + budget
+    workers = config.workers or os.cpu_count() or 1
+    rounds = int(math.ceil(len(clusters) / float(workers)))
+    solve_cluster = partial(_solve_cluster, route_solver, config._replace(time_limit_seconds=budget / rounds),
+                            vehicle_capacity, deadline)
+    if workers > 1 and len(subproblems) > 1:
+        pool = Pool(processes=min(workers, len(subproblems)))
+        try:
+            cluster_routes = pool.map(solve_cluster, subproblems)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        cluster_routes = [solve_cluster(subproblem) for subproblem in subproblems]
+
+    if any(routes is None for routes in cluster_routes):
+        return None
+    routes = []
+    for cluster_nodes, local_routes in zip(nodes, cluster_routes):
+        routes.extend([cluster_nodes[k] for k in route] for route in local_routes)
+    return routes
@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import time
+import numpy as np
+
+# Slack Induction by String Removals (SISR): ruin removes strings of customers from routes close
+# to a random seed customer, recreate reinserts them with blink-greedy insertion, and the result
+# is accepted with a simulated annealing criterion.
+
+# Average number of customers removed per ruin
+AVERAGE_REMOVED = 10
+# Longest string removed from one route
+MAX_STRING_LENGTH = 10
+# Probability of skipping an insertion position during recreate
+BLINK_RATE = 0.01
+# Start and final temperatures, relative to the mean customer distance from the depot
+START_TEMPERATURE = 0.2
+FINAL_TEMPERATURE = 0.002
+
+def _insertion_cost(dist, route, position, customer):
+    a = route[position - 1] if position > 0 else 0
+    b = route[position] if position < len(route) else 0
+    return dist[a][customer] + dist[customer][b] - dist[a][b]
+
+def _route_length(dist, route):
+    if not route:
+        return 0.0
+    total = dist[0][route[0]] + dist[route[-1]][0]
+    for a, b in zip(route, route[1:]):
+        total += dist[a][b]
+    return total
+
+class _Solution(object):
+    # Routes with cached loads and lengths; routes emptied by the ruin stay as free vehicles
+    def __init__(self, routes, demands, dist):
+        self.routes = [list(route) for route in routes if route]
+        self.loads = [sum(demands[c] for c in route) for route in self.routes]
+        self.lengths = [_route_length(dist, route) for route in self.routes]
+
+    def copy(self):
+        other = _Solution.__new__(_Solution)
+        other.routes = [list(route) for route in self.routes]
+        other.loads = list(self.loads)
+        other.lengths = list(self.lengths)
+        return other
+
+    def cost(self):
+        return sum(self.lengths)
+
+def _ruin(solution, adjacency, demands, dist, rng):
+    route_of = {}
+    for r, route in enumerate(solution.routes):
+        for c in route:
+            route_of[c] = r
+    average_cardinality = float(sum(len(route) for route in solution.routes)) / max(1, len(solution.routes))
+    max_string = min(MAX_STRING_LENGTH, average_cardinality)
+    max_strings = 4.0 * AVERAGE_REMOVED / (1 + max_string) - 1
+    string_count = int(rng.uniform(1, max_strings + 1))
+
+    seed = rng.randrange(1, len(demands))
+    removed = []
+    ruined = set()
+    for c in adjacency[seed]:
+        if len(ruined) >= string_count:
+            break
+        if c not in route_of or route_of[c] in ruined:
+            continue
+        r = route_of[c]
+        route = solution.routes[r]
+        string_length = int(rng.uniform(1, min(len(route), max_string) + 1))
+        # Pick a string of that length that contains c
+        position = route.index(c)
+        first = rng.randint(max(0, position - string_length + 1), min(position, len(route) - string_length))
+        string = route[first:first + string_length]
+        del route[first:first + string_length]
+        for customer in string:
+            del route_of[customer]
+        removed.extend(string)
+        solution.loads[r] -= sum(demands[customer] for customer in string)
+        solution.lengths[r] = _route_length(dist, route)
+        ruined.add(r)
+    return removed
+
+def _recreate(solution, removed, demands, capacity, vehicle_count, dist, depot_distance, rng):
+    # Blink-greedy insertion; False if some customer cannot be placed
+    order = rng.random()
+    if order < 4.0 / 11:
+        rng.shuffle(removed)
+    elif order < 8.0 / 11:
+        removed.sort(key=lambda c: -demands[c])
+    elif order < 10.0 / 11:
+        removed.sort(key=lambda c: -depot_distance[c])
+    else:
+        removed.sort(key=lambda c: depot_distance[c])
+
+    for customer in removed:
+        best = None
+        for r, route in enumerate(solution.routes):
+            if solution.loads[r] + demands[customer] > capacity:
+                continue
+            for position in range(len(route) + 1):
+                if rng.random() < BLINK_RATE:
+                    continue
+                cost = _insertion_cost(dist, route, position, customer)
+                if best is None or cost < best[0]:
+                    best = (cost, r, position)
+        if best is None:
+            if len(solution.routes) >= vehicle_count:
+                return False
+            solution.routes.append([customer])
+            solution.loads.append(demands[customer])
+            solution.lengths.append(2 * dist[0][customer])
+            continue
+        cost, r, position = best
+        solution.routes[r].insert(position, customer)
+        solution.loads[r] += demands[customer]
+        solution.lengths[r] += cost
+    return True
+
+def sisr_routes(customers, vehicle_count, vehicle_capacity, routes, time_limit_seconds,
+                distances=None, seed=0):
+    # Improves feasible routes (lists of customer indices) and returns the best routes found,
+    # padded with empty routes to vehicle_count
+    start_time = time.time()
+    rng = random.Random(seed)
+    demands = [customer.demand for customer in customers]
+    if distances is None:
+        coords = np.array([(customer.x, customer.y) for customer in customers], dtype=float)
+        distances = np.hypot(coords[:, 0, None] - coords[None, :, 0], coords[:, 1, None] - coords[None, :, 1])
+    adjacency = [[]] + [(np.argsort(distances[c, 1:], kind='stable') + 1).tolist() for c in range(1, len(customers))]
+    dist = distances.tolist()
+    depot_distance = dist[0]
+
+    current = _Solution(routes, demands, dist)
+    current_cost = current.cost()
+    best = current.copy()
+    best_cost = current_cost
+    if len(customers) < 3:
+        time_limit_seconds = 0
+
+    scale = float(np.mean(distances[0, 1:]))
+    start_temperature = START_TEMPERATURE * scale
+    final_temperature = FINAL_TEMPERATURE * scale
+    while True:
+        if time.time() - start_time >= time_limit_seconds:
+            break
+        elapsed = (time.time() - start_time) / time_limit_seconds
+        temperature = start_temperature * (final_temperature / start_temperature) ** elapsed
+        candidate = current.copy()
+        removed = _ruin(candidate, adjacency, demands, dist, rng)
+        if not _recreate(candidate, removed, demands, vehicle_capacity, vehicle_count, dist, depot_distance, rng):
+            continue
+        candidate_cost = candidate.cost()
+        if candidate_cost < current_cost - temperature * math.log(1 - rng.random()):
+            current, current_cost = candidate, candidate_cost
+            if current_cost < best_cost - 1e-9:
+                best, best_cost = current.copy(), current_cost
+    routes = [route for route in best.routes if route]
+    return routes + [[] for _ in range(vehicle_count - len(routes))]
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+
+# CVRP local search over plain arrays: relocate, swap, 2-opt (intra route), 2-opt* and
+# cross-exchange, driven by neighbor lists. Node 0 is the depot; routes are lists of customers.
+
+# Longest segment exchanged by cross-exchange
+MAX_SEGMENT = 3
+# Neighbors examined per customer
+NEIGHBOR_COUNT = 15
+
+def customer_neighbors(dist, k=NEIGHBOR_COUNT):
+    # k nearest customers of every customer, closest first; the depot row is left empty
+    n = len(dist)
+    k = min(k, n - 2)
+    neighbors = [[] for _ in range(n)]
+    if k <= 0:
+        return neighbors
+    order = np.argsort(dist[1:, 1:], axis=1, kind='stable') + 1
+    for u in range(1, n):
+        row = order[u - 1]
+        neighbors[u] = row[row != u][:k].tolist()
+    return neighbors
+
+def routes_length(dist, routes):
+    # Total length of the routes, each leaving from and returning to the depot
+    dist = np.asarray(dist)
+    total = 0.0
+    for route in routes:
+        if route:
+            path = np.concatenate(([0], route, [0]))
+            total += dist[path[:-1], path[1:]].sum()
+    return float(total)
+
+class _RouteState(object):
+    # Routes padded with the depot at both ends plus cached loads and node positions
+    def __init__(self, routes, demands):
+        self.demands = demands
+        self.routes = [[0] + list(route) + [0] for route in routes]
+        self.loads = [0] * len(self.routes)
+        self.route_of = [-1] * len(demands)
+        self.position = [0] * len(demands)
+        for r in range(len(self.routes)):
+            self.refresh(r)
+
+    def refresh(self, r):
+        route = self.routes[r]
+        self.loads[r] = sum(self.demands[node] for node in route)
+        for k in range(1, len(route) - 1):
+            self.route_of[route[k]] = r
+            self.position[route[k]] = k
+
+    def replace(self, r, customers):
+        self.routes[r] = [0] + customers + [0]
+        self.refresh(r)
+
+def improve_routes(dist, demands, capacity, routes, time_limit_seconds=None, neighbors=None):
+    # First-improvement descent until no move improves or the time limit is reached
+    deadline = time.time() + time_limit_seconds if time_limit_seconds else None
+    dist = dist.tolist() if isinstance(dist, np.ndarray) else dist
+    if neighbors is None:
+        neighbors = customer_neighbors(np.asarray(dist))
+    state = _RouteState(routes, demands)
+
+    def relocate(u, v):
+        ru, rv = state.route_of[u], state.route_of[v]
+        if ru != rv and state.loads[rv] + demands[u] > capacity:
+            return False
+        r1 = state.routes[ru]
+        i = state.position[u]
+        pu, nu = r1[i - 1], r1[i + 1]
+        removed = dist[pu][u] + dist[u][nu] - dist[pu][nu]
+        r2 = state.routes[rv]
+        j = state.position[v]
+        # Insert u right after v or right before v
+        for before in (False, True):
+            a, b = (r2[j - 1], v) if before else (v, r2[j + 1])
+            if u in (a, b):
+                continue
+            if dist[a][u] + dist[u][b] - dist[a][b] < removed - 1e-9:
+                rest = [node for node in r1[1:-1] if node != u]
+                if ru == rv:
+                    at = rest.index(v) + (0 if before else 1)
+                    state.replace(ru, rest[:at] + [u] + rest[at:])
+                else:
+                    at = j - 1 + (0 if before else 1)
+                    target = r2[1:-1]
+                    state.replace(ru, rest)
+                    state.replace(rv, target[:at] + [u] + target[at:])
+                return True
+        return False
+
+    def swap(u, v):
+        ru, rv = state.route_of[u], state.route_of[v]
+        if ru == rv:
+            return False
+        if state.loads[ru] - demands[u] + demands[v] > capacity or \
+                state.loads[rv] - demands[v] + demands[u] > capacity:
+            return False
+        r1, r2 = state.routes[ru], state.routes[rv]
+        i, j = state.position[u], state.position[v]
+        pu, nu, pv, nv = r1[i - 1], r1[i + 1], r2[j - 1], r2[j + 1]
+        delta = (dist[pu][v] + dist[v][nu] - dist[pu][u] - dist[u][nu]
+                 + dist[pv][u] + dist[u][nv] - dist[pv][v] - dist[v][nv])
+        if delta < -1e-9:
+            r1, r2 = list(r1), list(r2)
+            r1[i], r2[j] = v, u
+            state.replace(ru, r1[1:-1])
+            state.replace(rv, r2[1:-1])
+            return True
+        return False
+
+    def two_opt(u, v):
+        # Intra route: reverse the path between u and v so that u and v become adjacent
+        ru = state.route_of[u]
+        if ru != state.route_of[v]:
+            return False
+        route = state.routes[ru]
+        i, j = state.position[u], state.position[v]
+        if i > j:
+            i, j = j, i
+        a, b, c, d = route[i], route[i + 1], route[j], route[j + 1]
+        if dist[a][c] + dist[b][d] - dist[a][b] - dist[c][d] < -1e-9:
+            state.replace(ru, route[1:i + 1] + route[i + 1:j + 1][::-1] + route[j + 1:-1])
+            return True
+        return False
+
+    def two_opt_star(u, v):
+        # Inter route: exchange the tails after u and after v, or join u to v reversing the heads
+        ru, rv = state.route_of[u], state.route_of[v]
+        if ru == rv:
+            return False
+        r1, r2 = state.routes[ru], state.routes[rv]
+        i, j = state.position[u], state.position[v]
+        nu, nv = r1[i + 1], r2[j + 1]
+        head1 = sum(demands[node] for node in r1[1:i + 1])
+        head2 = sum(demands[node] for node in r2[1:j + 1])
+        tail1 = state.loads[ru] - head1
+        tail2 = state.loads[rv] - head2
+        base = dist[u][nu] + dist[v][nv]
+        if head1 + tail2 <= capacity and head2 + tail1 <= capacity and \
+                dist[u][nv] + dist[v][nu] < base - 1e-9:
+            state.replace(ru, r1[1:i + 1] + r2[j + 1:-1])
+            state.replace(rv, r2[1:j + 1] + r1[i + 1:-1])
+            return True
+        if head1 + head2 <= capacity and tail1 + tail2 <= capacity and \
+                dist[u][v] + dist[nu][nv] < base - 1e-9:
+            state.replace(ru, r1[1:i + 1] + r2[1:j + 1][::-1])
+            state.replace(rv, r1[i + 1:-1][::-1] + r2[j + 1:-1])
+            return True
+        return False
+
+    def cross_exchange(u, v):
+        # Exchange the segment starting at u with the segment starting at v
+        ru, rv = state.route_of[u], state.route_of[v]
+        if ru == rv:
+            return False
+        r1, r2 = state.routes[ru], state.routes[rv]
+        i, j = state.position[u], state.position[v]
+        for len1 in range(1, MAX_SEGMENT + 1):
+            if i + len1 > len(r1) - 1:
+                break
+            load1 = sum(demands[node] for node in r1[i:i + len1])
+            for len2 in range(1, MAX_SEGMENT + 1):
+                if j + len2 > len(r2) - 1:
+                    break
+                if len1 == 1 and len2 == 1:
+                    continue
+                load2 = sum(demands[node] for node in r2[j:j + len2])
+                if state.loads[ru] - load1 + load2 > capacity or state.loads[rv] - load2 + load1 > capacity:
+                    continue
+                pu, last1, n1 = r1[i - 1], r1[i + len1 - 1], r1[i + len1]
+                pv, last2, n2 = r2[j - 1], r2[j + len2 - 1], r2[j + len2]
+                delta = (dist[pu][v] + dist[last2][n1] + dist[pv][u] + dist[last1][n2]
+                         - dist[pu][u] - dist[last1][n1] - dist[pv][v] - dist[last2][n2])
+                if delta < -1e-9:
+                    state.replace(ru, r1[1:i] + r2[j:j + len2] + r1[i + len1:-1])
+                    state.replace(rv, r2[1:j] + r1[i:i + len1] + r2[j + len2:-1])
+                    return True
+        return False
+
+    moves = (relocate, swap, two_opt, two_opt_star, cross_exchange)
+    improved = True
+    while improved:
+        improved = False
+        for u in range(1, len(demands)):
+            if deadline is not None and time.time() > deadline:
+                return [route[1:-1] for route in state.routes]
+            for v in neighbors[u]:
+                if any(move(u, v) for move in moves):
+                    improved = True
+                    break
+    return [route[1:-1] for route in state.routes]
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+from multiprocessing import Pool
+import numpy as np
+
+# Every route is a small TSP through the depot: short routes are solved exactly with the
+# Held-Karp dynamic program, longer ones are improved with 2-opt and Or-opt. Routes are
+# independent, so they are re-optimized in a process pool.
+
+# Longest route, in customers, solved exactly
+EXACT_ROUTE_SIZE = 12
+# Longest segment moved by Or-opt
+MAX_SEGMENT = 3
+
+def _held_karp(dist):
+    # Optimal order of nodes 1..m of the matrix, starting and ending at node 0
+    m = len(dist) - 1
+    d = dist[1:, 1:]
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.zeros((1 << m, m), dtype=np.int64)
+    for j in range(m):
+        cost[1 << j, j] = dist[0, j + 1]
+    for mask in range(1, 1 << m):
+        # Best extension of every path ending in mask to every node j
+        extended = cost[mask][:, None] + d
+        best = extended.argmin(axis=0)
+        for j in range(m):
+            if mask & (1 << j):
+                continue
+            value = extended[best[j], j]
+            target = mask | (1 << j)
+            if value < cost[target, j]:
+                cost[target, j] = value
+                parent[target, j] = best[j]
+    full = (1 << m) - 1
+    last = int((cost[full] + dist[1:, 0]).argmin())
+    order = []
+    mask = full
+    while mask:
+        order.append(last + 1)
+        previous = int(parent[mask, last])
+        mask ^= 1 << last
+        last = previous
+    return order[::-1]
+
+def _improve_path(dist, order):
+    # 2-opt and Or-opt on the cycle 0 -> order -> 0 until no move improves
+    dist = dist.tolist()
+    tour = [0] + list(order) + [0]
+    improved = True
+    while improved:
+        improved = False
+        n = len(tour)
+        for i in range(n - 3):
+            for j in range(i + 2, n - 1):
+                a, b, c, d = tour[i], tour[i + 1], tour[j], tour[j + 1]
+                if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-9:
+                    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                    improved = True
+        for length in range(1, MAX_SEGMENT + 1):
+            for i in range(1, n - length):
+                first, last = tour[i], tour[i + length - 1]
+                p, q = tour[i - 1], tour[i + length]
+                gain = dist[p][first] + dist[last][q] - dist[p][q]
+                rest = tour[:i] + tour[i + length:]
+                segment = tour[i:i + length]
+                for k in range(len(rest) - 1):
+                    a, b = rest[k], rest[k + 1]
+                    if k == i - 1:
+                        continue
+                    forward = dist[a][first] + dist[last][b] - dist[a][b]
+                    backward = dist[a][last] + dist[first][b] - dist[a][b]
+                    if min(forward, backward) < gain - 1e-9:
+                        moved = segment if forward <= backward else segment[::-1]
+                        tour = rest[:k + 1] + moved + rest[k + 1:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+    return tour[1:-1]
+
+def _route_cost(dist, order):
+    path = [0] + list(order) + [0]
+    return float(dist[path[:-1], path[1:]].sum())
+
+def reoptimize_route(dist):
+    # dist is the distance matrix of the depot followed by the route's customers in route order;
+    # returns the new order as positions 1..m into that matrix
+    m = len(dist) - 1
+    if m < 3:
+        return list(range(1, m + 1))
+    if m <= EXACT_ROUTE_SIZE:
+        order = _held_karp(dist)
+    else:
+        order = _improve_path(dist, range(1, m + 1))
+    if _route_cost(dist, order) < _route_cost(dist, range(1, m + 1)) - 1e-9:
+        return order
+    return list(range(1, m + 1))
+
+def reoptimize_routes(distances, routes, workers=None):
+    # Re-optimizes every route on its own, in parallel when more than one worker is available
+    distances = np.asarray(distances)
+    nodes = [[0] + list(route) for route in routes]
+    matrices = [distances[np.ix_(route, route)] for route in nodes]
+    workers = min(workers or os.cpu_count() or 1, len(routes))
+    if workers > 1:
+        pool = Pool(processes=workers)
+        try:
+            orders = pool.map(reoptimize_route, matrices)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        orders = [reoptimize_route(matrix) for matrix in matrices]
+    return [[route[k] for k in order] for route, order in zip(nodes, orders)]
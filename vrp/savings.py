@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import heapq
+
+# Clarke-Wright savings. Routes are kept as undirected chains: every customer has at most two
+# links, and the two endpoints of a chain know each other (other_end) and carry its load, so
+# checking and merging two routes is O(1).
+
+def _merge_candidates(distances, neighbors):
+    # Savings d(0, i) + d(0, j) - d(i, j) for every customer and its nearest neighbors
+    heap = []
+    for i in range(1, len(distances)):
+        for j in neighbors[i]:
+            if i < j or i not in neighbors[j]:
+                heap.append((distances[i][j] - distances[0][i] - distances[0][j], i, j))
+    heapq.heapify(heap)
+    return heap
+
+def savings_routes(distances, demands, capacity, vehicle_count, neighbors):
+    # Returns at most vehicle_count routes, or None if the merges cannot get down to that many
+    n = len(demands)
+    distances = distances.tolist() if hasattr(distances, 'tolist') else distances
+    links = [[] for _ in range(n)]
+    other_end = list(range(n))
+    load = list(demands)
+    route_count = n - 1
+
+    def merge(i, j):
+        # i and j are endpoints of two different routes
+        end_i, end_j = other_end[i], other_end[j]
+        links[i].append(j)
+        links[j].append(i)
+        other_end[end_i] = end_j
+        other_end[end_j] = end_i
+        load[end_i] = load[end_j] = load[i] + load[j]
+
+    def can_merge(i, j):
+        return (len(links[i]) < 2 and len(links[j]) < 2 and other_end[i] != j
+                and load[i] + load[j] <= capacity)
+
+    heap = _merge_candidates(distances, neighbors)
+    while heap:
+        change, i, j = heapq.heappop(heap)
+        if change >= 0 and route_count <= vehicle_count:
+            break
+        if can_merge(i, j):
+            merge(i, j)
+            route_count -= 1
+
+    # Too many routes left: merge the remaining endpoints regardless of neighborhood
+    while route_count > vehicle_count:
+        endpoints = [u for u in range(1, n) if len(links[u]) < 2]
+        best = None
+        for a in endpoints:
+            for b in endpoints:
+                if a < b and can_merge(a, b):
+                    change = distances[a][b] - distances[0][a] - distances[0][b]
+                    if best is None or change < best[0]:
+                        best = (change, a, b)
+        if best is None:
+            return None
+        merge(best[1], best[2])
+        route_count -= 1
+
+    # Walk every chain from one of its endpoints
+    routes = []
+    visited = [False] * n
+    for start in range(1, n):
+        if visited[start] or len(links[start]) == 2:
+            continue
+        route = [start]
+        visited[start] = True
+        previous = None
+        current = start
+        while True:
+            step = [node for node in links[current] if node != previous]
+            if not step:
+                break
+            previous, current = current, step[0]
+            visited[current] = True
+            route.append(current)
+        routes.append(route)
+    return routes + [[] for _ in range(vehicle_count - len(routes))]
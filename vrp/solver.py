@@ -1,97 +1,161 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import argparse
+import bisect
 import math
+import sys
+import time
 from collections import namedtuple
+from functools import partial
+import numpy as np
 from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
+from decompose import CLUSTER_SIZE, solve_decomposed
+from local_search import customer_neighbors, improve_routes
+from route_tsp import reoptimize_routes
+from lns import sisr_routes
+from savings import savings_routes
+from split import split_routes
+from validator import validate_routes
 
 Customer = namedtuple("Customer", ['index', 'demand', 'x', 'y'])
+SolverConfig = namedtuple("SolverConfig", ['time_limit_seconds', 'first_solution_strategy', 'metaheuristic',
+                                           'lns_time_limit_ms', 'solution_limit', 'engine', 'construction',
+                                           'workers', 'cluster_size', 'cluster_method',
+                                           'deadline_seconds'])
+
+# OR-Tools works with integer arc costs, so distances are scaled before truncation
+DISTANCE_SCALE = 100
+# Seconds the local search may spend polishing a solution
+LOCAL_SEARCH_TIME_LIMIT = 30
+# From this many customers the SISR engine beats OR-Tools within the same time budget
+SISR_CUSTOMER_COUNT = 200
+# Constructions of the initial routes: Clarke-Wright savings and the split of a giant tour
+CONSTRUCTIONS = {'savings': savings_routes, 'split': split_routes}
+# Share of the deadline kept free for the fallback tiers and the polishing
+DEADLINE_RESERVE_SHARE = 0.2
+# Share of the deadline the split construction may spend
+CONSTRUCTION_TIME_SHARE = 0.2
 
 def length(customer1, customer2):
     return math.sqrt((customer1.x - customer2.x)**2 + (customer1.y - customer2.y)**2)
 
-def create_distance_callback(customers):
-    # Creates callback to return distance between customers.
-    _distances = {}
-    num_customers = len(customers)
-    for from_node in range(num_customers):
-        _distances[from_node] = {}
-        for to_node in range(num_customers):
-            if from_node == to_node:
-                _distances[from_node][to_node] = 0
-            else:
-                _distances[from_node][to_node] = length(customers[from_node], customers[to_node])
-
-    def distance_callback(from_node, to_node):
-        return _distances[from_node][to_node]
-
-    return distance_callback
-
-def create_demand_callback(customers):
-    # Creates callback to get demands at each location.
-    def demand_callback(from_node, to_node):
-        return customers[from_node].demand
-    return demand_callback
-
-def add_capacity_constraints(routing, demand_callback, vehicle_capacities):
+def create_distance_matrix(customers):
+    # Euclidean distances between all customers, computed with broadcasting
+    coords = np.array([(customer.x, customer.y) for customer in customers], dtype=float)
+    return np.hypot(coords[:, 0, None] - coords[None, :, 0], coords[:, 1, None] - coords[None, :, 1])
+
+def scaled_distance_matrix(distances):
+    # Integer arc costs for OR-Tools, scaled so that two decimals survive truncation
+    return (DISTANCE_SCALE * distances).astype(np.int64).tolist()
+
+def add_capacity_constraints(routing, customers, vehicle_capacities):
     # Adds capacity constraint
     capacity = "Capacity"
+    demand_callback_index = routing.RegisterUnaryTransitVector(
+        [customer.demand for customer in customers])
     routing.AddDimensionWithVehicleCapacity(
-        demand_callback,
+        demand_callback_index,
         0, # null capacity slack
         vehicle_capacities,
         True, # start cumul to zero
         capacity)
 
-def trivial_solution(customer_count, vehicle_count, vehicle_capacity, customers):
-    #the depot is always the first customer in the input
-    depot = customers[0]
+def trivial_routes(vehicle_count, vehicle_capacity, customers):
+    # assign customers to vehicles starting by the largest customer demands: every vehicle
+    # repeatedly takes the largest remaining demand that still fits, found by bisection in the
+    # remaining demands kept sorted. Returns None if some customers do not fit.
+    remaining = sorted(customers[1:], key=lambda customer: customer.demand)
+    remaining_demands = [customer.demand for customer in remaining]
 
-
-    # build a trivial solution
-    # assign customers to vehicles starting by the largest customer demands
     vehicle_tours = []
-
-    remaining_customers = set(customers)
-    remaining_customers.remove(depot)
-
     for v in range(0, vehicle_count):
-        # print "Start Vehicle: ",v
         vehicle_tours.append([])
         capacity_remaining = vehicle_capacity
-        while sum([capacity_remaining >= customer.demand for customer in remaining_customers]) > 0:
-            used = set()
-            order = sorted(remaining_customers, key=lambda customer: -customer.demand)
-            for customer in order:
-                if capacity_remaining >= customer.demand:
-                    capacity_remaining -= customer.demand
-                    vehicle_tours[v].append(customer)
-                    # print '   add', ci, capacity_remaining
-                    used.add(customer)
-            remaining_customers -= used
-
-    # checks that the number of customers served is correct
-    assert sum([len(v) for v in vehicle_tours]) == len(customers) - 1
-
-    # calculate the cost of the solution; for each vehicle the length of the route
-    obj = 0
-    for v in range(0, vehicle_count):
-        vehicle_tour = vehicle_tours[v]
-        if len(vehicle_tour) > 0:
-            obj += length(depot,vehicle_tour[0])
-            for i in range(0, len(vehicle_tour)-1):
-                obj += length(vehicle_tour[i],vehicle_tour[i+1])
-            obj += length(vehicle_tour[-1],depot)
+        while remaining:
+            position = bisect.bisect_right(remaining_demands, capacity_remaining) - 1
+            if position < 0:
+                break
+            customer = remaining.pop(position)
+            remaining_demands.pop(position)
+            capacity_remaining -= customer.demand
+            vehicle_tours[v].append(customer.index)
 
-    # prepare the solution in the specified output format
-    outputData = '%.2f' % obj + ' ' + str(0) + '\n'
-    for v in range(0, vehicle_count):
-        outputData += str(depot.index) + ' ' + ' '.join([str(customer.index) for customer in vehicle_tours[v]]) + ' ' + str(depot.index) + '\n'
+    if remaining:
+        return None
+    return vehicle_tours
 
-    return outputData
+def default_config(customer_count):
+    # Search settings scaled by the instance size
+    return SolverConfig(time_limit_seconds=int(min(300, max(10, customer_count // 2))),
+                        first_solution_strategy='PATH_CHEAPEST_ARC',
+                        metaheuristic='GUIDED_LOCAL_SEARCH', lns_time_limit_ms=100,
+                        solution_limit=None,
+                        engine='sisr' if customer_count >= SISR_CUSTOMER_COUNT else 'ortools',
+                        construction='savings', workers=None, cluster_size=CLUSTER_SIZE,
+                        cluster_method='sweep', deadline_seconds=None)
+
+def create_search_parameters(config):
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        getattr(routing_enums_pb2.FirstSolutionStrategy, config.first_solution_strategy))
+    search_parameters.local_search_metaheuristic = (
+        getattr(routing_enums_pb2.LocalSearchMetaheuristic, config.metaheuristic))
+    if config.time_limit_seconds:
+        search_parameters.time_limit.FromMilliseconds(int(1000 * config.time_limit_seconds))
+    search_parameters.lns_time_limit.FromMilliseconds(config.lns_time_limit_ms)
+    if config.solution_limit:
+        search_parameters.solution_limit = config.solution_limit
+    return search_parameters
 
-def solve_it(input_data):
+def solve_routing(customers, vehicle_count, vehicle_capacity, distances, config, initial_routes=None):
+    # Solves the CVRP with OR-Tools, starting from initial_routes when given and readable as an
+    # assignment. Returns one list of customers per vehicle, or None if no solution was found.
+    customer_count = len(customers)
+    manager = pywrapcp.RoutingIndexManager(customer_count, vehicle_count, 0)
+    routing = pywrapcp.RoutingModel(manager)
+    transit_callback_index = routing.RegisterTransitMatrix(scaled_distance_matrix(distances))
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    # Add Capacity constraint
+    add_capacity_constraints(routing, customers, [vehicle_capacity] * vehicle_count)
+    # Search settings: first solution heuristic, metaheuristic and limits.
+    search_parameters = create_search_parameters(config)
+    initial_assignment = None
+    if initial_routes is not None:
+        routing.CloseModelWithParameters(search_parameters)
+        initial_assignment = routing.ReadAssignmentFromRoutes(initial_routes, True)
+    if initial_assignment is not None:
+        assignment = routing.SolveFromAssignmentWithParameters(initial_assignment, search_parameters)
+    else:
+        assignment = routing.SolveWithParameters(search_parameters)
+    if not assignment:
+        return None
+    solution_routes = []
+    for vehicle_id in range(vehicle_count):
+        solution_route = []
+        index = routing.Start(vehicle_id)
+        while not routing.IsEnd(index):
+            node_index = manager.IndexToNode(index)
+            solution_route.append(node_index)
+            index = assignment.Value(routing.NextVar(index))
+        solution_routes.append(solution_route[1:])
+    return solution_routes
+
+def run_tiers(tiers):
+    # Runs (name, function) tiers until one returns routes, reporting every tier's time on stderr
+    for name, tier in tiers:
+        tier_start = time.time()
+        routes = tier()
+        sys.stderr.write('tier %s: %s in %.2fs\n' % (name, 'no solution' if routes is None else 'solved',
+                                                      time.time() - tier_start))
+        if routes is not None:
+            return routes
+    return None
+
+def solve_it(input_data, **options):
+    # options override the fields of the default SolverConfig for this instance size
+    start_time = time.time()
     # Modify this code to run your optimization algorithm
 
     # parse the input
@@ -108,54 +172,130 @@ def solve_it(input_data):
         parts = line.split()
         customers.append(Customer(i-1, int(parts[0]), float(parts[1]), float(parts[2])))
 
-    # Get the trivial solution
-    trivial_solution_output = trivial_solution(customer_count, vehicle_count, vehicle_capacity, customers)
+    config = default_config(customer_count)._replace(**options)
 
-    # Use Google OR-Tool for CVRP
-    routing = pywrapcp.RoutingModel(customer_count, vehicle_count, 0)
-    distance_callback = create_distance_callback(customers)
-    routing.SetArcCostEvaluatorOfAllVehicles(distance_callback)
-    # Add Capacity constraint
-    demand_callback = create_demand_callback(customers)
-    add_capacity_constraints(routing, demand_callback, [vehicle_capacity] * vehicle_count)
-    # Setting first solution heuristic (cheapest addition).
-    search_parameters = pywrapcp.RoutingModel.DefaultSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-    # Solve the problem.
-    assignment = routing.SolveWithParameters(search_parameters)
-    if assignment:
-        total_dist = 0.0
-        solution_routes = []
-        for vehicle_id in range(vehicle_count):
-            solution_route = []
-            index = routing.Start(vehicle_id)
-            while not routing.IsEnd(index):
-                node_index = routing.IndexToNode(index)
-                solution_route.append(node_index)
-                next_node_index = routing.IndexToNode(assignment.Value(routing.NextVar(index)))
-                total_dist += length(customers[node_index], customers[next_node_index])
-                index = assignment.Value(routing.NextVar(index))
-
-            node_index = routing.IndexToNode(index)
-            solution_route.append(node_index)
-            solution_routes.append(solution_route[1:-1])
+    # One distance matrix serves the routing model, the local search and the objective
+    distances = create_distance_matrix(customers)
+
+    def remaining():
+        # Seconds left before the deadline, None without one
+        if not config.deadline_seconds:
+            return None
+        return config.deadline_seconds - (time.time() - start_time)
+
+    def engine_config():
+        # The engine's time limit, shortened so that the deadline leaves room for the later stages
+        if remaining() is None:
+            return config
+        budget = remaining() - DEADLINE_RESERVE_SHARE * config.deadline_seconds
+        return config._replace(time_limit_seconds=max(0.1, min(config.time_limit_seconds or budget, budget)))
+
+    # The constructed routes seed the engines when they fit the fleet; the other construction
+    # is tried when the configured one cannot fit
+    neighbors = customer_neighbors(distances)
+    demands = [customer.demand for customer in customers]
+    construction_names = [config.construction] + sorted(name for name in CONSTRUCTIONS if name != config.construction)
+    initial_routes = None
+    initial_name = 'construction'
+    for construction_name in construction_names:
+        if remaining() is not None and remaining() <= DEADLINE_RESERVE_SHARE * config.deadline_seconds:
+            # No time left to construct; the bin-packing routes are the fallback
+            break
+        construction = CONSTRUCTIONS[construction_name]
+        if construction_name == 'split' and remaining() is not None:
+            # The giant tour behind the split is slow, under a deadline it gets a share of it
+            construction = partial(split_routes, time_limit_seconds=CONSTRUCTION_TIME_SHARE * config.deadline_seconds)
+        initial_routes = construction(distances, demands, vehicle_capacity, vehicle_count, neighbors)
+        if initial_routes is not None:
+            initial_name = construction_name
+            break
+    packed_routes = None
+    if initial_routes is None:
+        # Under tight capacity only the bin-packing routes may fit; ordered as TSPs they still give
+        # the engines a feasible start
+        packed_routes = trivial_routes(vehicle_count, vehicle_capacity, customers)
+        if packed_routes is not None:
+            packed_routes = reoptimize_routes(distances, packed_routes, 1)
+    seed_routes = initial_routes or packed_routes
+
+    def run_engine():
+        if remaining() is not None and remaining() <= DEADLINE_RESERVE_SHARE * config.deadline_seconds:
+            return None
+        if config.engine == 'sisr':
+            if seed_routes is None:
+                return None
+            return sisr_routes(customers, vehicle_count, vehicle_capacity, seed_routes,
+                               engine_config().time_limit_seconds or 300, distances)
+        routes = None
+        if config.engine == 'decompose':
+            # Clusters solved in parallel; the whole instance is solved when a cluster fails
+            routes = solve_decomposed(customers, vehicle_count, vehicle_capacity, distances,
+                                      solve_routing, engine_config())
+        if routes is None:
+            routes = solve_routing(customers, vehicle_count, vehicle_capacity, distances, engine_config(),
+                                   seed_routes)
+        return routes
+
+    # Tiers in order of quality; the first one that returns routes wins
+    tiers = [(config.engine, run_engine),
+             (initial_name, lambda: initial_routes),
+             ('bin-packing', lambda: packed_routes or trivial_routes(vehicle_count, vehicle_capacity, customers))]
+    if seed_routes is None and config.engine == 'sisr':
+        # SISR needs a feasible start; without one OR-Tools searches from scratch
+        tiers.append(('ortools', lambda: solve_routing(customers, vehicle_count, vehicle_capacity, distances,
+                                                       engine_config())))
+    solution_routes = run_tiers(tiers)
+    if solution_routes is None:
+        raise ValueError('no tier found routes that fit {} vehicles of capacity {}'.format(
+            vehicle_count, vehicle_capacity))
+
+    # Polish the routes with the array-based local search
+    polish_time = LOCAL_SEARCH_TIME_LIMIT
+    if remaining() is not None:
+        polish_time = max(0.1, min(polish_time, remaining() - 1))
+    solution_routes = improve_routes(distances, demands, vehicle_capacity, solution_routes, polish_time, neighbors)
+    # Each route is an independent TSP through the depot, re-optimized in parallel
+    solution_routes = reoptimize_routes(distances, solution_routes, config.workers)
+    # Every engine's answer is checked for coverage, capacity and fleet size before it is reported
+    total_dist = validate_routes(distances, demands, vehicle_capacity, vehicle_count, solution_routes)
+
+    # prepare the solution in the specified output format
+    outputData = '%.2f' % total_dist + ' ' + str(0) + '\n'
+    for v in range(0, vehicle_count):
+        outputData += str(0) + ' ' + ' '.join([str(customer) for customer in solution_routes[v]]) + ' ' + str(0) + '\n'
+    return outputData
 
-        # prepare the solution in the specified output format
-        outputData = '%.2f' % total_dist + ' ' + str(0) + '\n'
-        for v in range(0, vehicle_count):
-            outputData += str(0) + ' ' + ' '.join([str(customer) for customer in solution_routes[v]]) + ' ' + str(0) + '\n'
-        return outputData
+def parse_options(args):
+    # Command line flags map onto SolverConfig fields, unset flags keep the size-based defaults
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_location', nargs='?')
+    parser.add_argument('--time-limit', dest='time_limit_seconds', type=float)
+    parser.add_argument('--first-solution', dest='first_solution_strategy',
+                        choices=routing_enums_pb2.FirstSolutionStrategy.Value.keys())
+    parser.add_argument('--metaheuristic',
+                        choices=routing_enums_pb2.LocalSearchMetaheuristic.Value.keys())
+    parser.add_argument('--lns-time-limit-ms', dest='lns_time_limit_ms', type=int)
+    parser.add_argument('--solution-limit', dest='solution_limit', type=int)
+    parser.add_argument('--engine', choices=['ortools', 'sisr', 'decompose'])
+    parser.add_argument('--construction', choices=sorted(CONSTRUCTIONS))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cluster-size', dest='cluster_size', type=int)
+    parser.add_argument('--cluster-method', dest='cluster_method', choices=['sweep', 'kmeans'])
+    parser.add_argument('--deadline', dest='deadline_seconds', type=float)
+    parsed = vars(parser.parse_args(args))
+    file_location = parsed.pop('file_location')
+    return file_location, dict((key, value) for key, value in parsed.items() if value is not None)
 
 import sys
 
 if __name__ == '__main__':
     import sys
-    if len(sys.argv) > 1:
-        file_location = sys.argv[1].strip()
+    file_location, options = parse_options(sys.argv[1:])
+    if file_location:
+        file_location = file_location.strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print(solve_it(input_data))
+        print(solve_it(input_data, **options))
     else:
 
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/vrp_5_4_1)')
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+from local_search import improve_routes, routes_length
+
+# Route-first cluster-second: a giant tour over all customers is cut into capacity-feasible routes
+# by Prins' split, a shortest path over the tour positions. Node 0 is the depot.
+
+# Seconds spent improving the giant tour
+GIANT_TOUR_TIME_LIMIT = 5
+# Starting points of the giant tour tried by the split
+ROTATION_COUNT = 20
+
+def giant_tour(distances, neighbors, time_limit_seconds=GIANT_TOUR_TIME_LIMIT):
+    # Nearest neighbor tour from the depot, improved as one uncapacitated route by the local search
+    n = len(distances)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    tour = []
+    current = 0
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distances[current])
+        current = int(row.argmin())
+        visited[current] = True
+        tour.append(current)
+    demands = [0] * n
+    return improve_routes(distances, demands, 0, [tour], time_limit_seconds, neighbors)[0]
+
+def split_tour(distances, demands, capacity, vehicle_count, tour):
+    # Optimal cut of the tour into at most vehicle_count routes, None if no cut fits the fleet.
+    # cost[k][j] is the cheapest way to serve the first j customers of the tour with k routes;
+    # a route serving tour[i:j] costs d(0, tour[i]) + path(tour[i] .. tour[j-1]) + d(tour[j-1], 0).
+    n = len(tour)
+    tour = np.asarray(tour)
+    load = np.concatenate(([0], np.cumsum(np.asarray(demands)[tour])))
+    path = np.concatenate(([0.0, 0.0], np.cumsum(distances[tour[:-1], tour[1:]])))
+    depot = distances[0, tour]
+    # Largest j such that tour[i:j] fits in one vehicle
+    last = np.searchsorted(load, load[:-1] + capacity, side='right') - 1
+
+    cost = np.full((vehicle_count + 1, n + 1), np.inf)
+    cut = np.zeros((vehicle_count + 1, n + 1), dtype=np.int64)
+    cost[0, 0] = 0.0
+    for k in range(1, vehicle_count + 1):
+        previous = cost[k - 1]
+        for i in np.flatnonzero(np.isfinite(previous[:n])).tolist():
+            j = np.arange(i + 1, last[i] + 1)
+            candidate = previous[i] + depot[i] + path[j] - path[i + 1] + depot[j - 1]
+            better = candidate < cost[k, j]
+            cost[k, j[better]] = candidate[better]
+            cut[k, j[better]] = i
+    k = int(cost[:, n].argmin())
+    if not np.isfinite(cost[k, n]):
+        return None
+
+    routes = []
+    j = n
+    while k > 0:
+        i = cut[k, j]
+        routes.append(tour[i:j].tolist())
+        j, k = i, k - 1
+    routes.reverse()
+    return routes + [[] for _ in range(vehicle_count - len(routes))]
+
+def split_routes(distances, demands, capacity, vehicle_count, neighbors, time_limit_seconds=None):
+    # Splits rotations of the giant tour in both directions and keeps the cheapest result. With a
+    # time limit the giant tour gets at most half of it and the rotations stop once it is spent.
+    deadline = None
+    tour_time = GIANT_TOUR_TIME_LIMIT
+    if time_limit_seconds is not None:
+        deadline = time.time() + time_limit_seconds
+        tour_time = min(tour_time, time_limit_seconds / 2.0)
+    tour = giant_tour(distances, neighbors, tour_time)
+    step = max(1, len(tour) // ROTATION_COUNT)
+    best = None
+    for start in range(0, len(tour), step):
+        if deadline is not None and time.time() > deadline:
+            break
+        rotated = tour[start:] + tour[:start]
+        for oriented in (rotated, rotated[::-1]):
+            routes = split_tour(distances, demands, capacity, vehicle_count, oriented)
+            if routes is None:
+                continue
+            total = routes_length(distances, routes)
+            if best is None or total < best[0]:
+                best = (total, routes)
+    return best[1] if best else None
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import numpy as np
+
+def validate_routes(distances, demands, capacity, vehicle_count, routes):
+    # Returns the total length of the routes, raising ValueError unless every customer is visited
+    # exactly once, no route exceeds the capacity and there are at most vehicle_count routes
+    customer_count = len(demands)
+    if len(routes) > vehicle_count:
+        raise ValueError('{} routes for {} vehicles'.format(len(routes), vehicle_count))
+    sizes = np.array([len(route) for route in routes], dtype=np.int64)
+    visits = np.concatenate([np.asarray(route, dtype=np.int64) for route in routes] + [np.zeros(0, np.int64)])
+    if visits.size and (visits.min() < 1 or visits.max() >= customer_count):
+        raise ValueError('routes contain nodes outside 1..{}'.format(customer_count - 1))
+    seen = np.bincount(visits, minlength=customer_count)
+    seen[0] = 1
+    if (seen != 1).any():
+        customer = int(np.flatnonzero(seen != 1)[0])
+        raise ValueError('customer {} is visited {} times'.format(customer, int(seen[customer])))
+
+    route_of = np.repeat(np.arange(len(routes)), sizes)
+    loads = np.bincount(route_of, weights=np.asarray(demands)[visits], minlength=len(routes))
+    if (loads > capacity).any():
+        vehicle = int(np.flatnonzero(loads > capacity)[0])
+        raise ValueError('vehicle {} carries {:g}, capacity is {}'.format(vehicle, loads[vehicle], capacity))
+
+    # One path through all routes, returning to the depot between them: the depot comes first and
+    # after every route, so the k-th visit of route r is at position k + r + 1
+    path = np.zeros(visits.size + len(routes) + 1, dtype=np.int64)
+    path[np.arange(visits.size) + route_of + 1] = visits
+    distances = np.asarray(distances)
+    return float(distances[path[:-1], path[1:]].sum())
+
+def parse_problem(input_data):
+    # Distance matrix, demands, capacity and vehicle count of a problem in the input format
+    lines = input_data.split('\n')
+    customer_count, vehicle_count, capacity = [int(part) for part in lines[0].split()]
+    rows = np.array([[float(part) for part in lines[i].split()] for i in range(1, customer_count + 1)])
+    coords = rows[:, 1:3]
+    distances = np.hypot(coords[:, 0, None] - coords[None, :, 0], coords[:, 1, None] - coords[None, :, 1])
+    return distances, rows[:, 0].astype(np.int64), capacity, vehicle_count
+
+def check_solution(input_data, output_data, tolerance=0.01):
+    # Returns the recomputed objective, raising ValueError if the solution is invalid
+    distances, demands, capacity, vehicle_count = parse_problem(input_data)
+    lines = [line for line in output_data.strip().split('\n') if line.strip()]
+    claimed = float(lines[0].split()[0])
+    routes = []
+    for line in lines[1:]:
+        nodes = [int(node) for node in line.split()]
+        if len(nodes) < 2 or nodes[0] != 0 or nodes[-1] != 0:
+            raise ValueError('route "{}" does not start and end at the depot'.format(line))
+        routes.append(nodes[1:-1])
+    obj = validate_routes(distances, demands, capacity, vehicle_count, routes)
+    if abs(obj - claimed) > tolerance + 1e-9 * obj:
+        raise ValueError('reported objective {} but the routes have length {:.2f}'.format(claimed, obj))
+    return obj
+
+def check_directory(data_directory, **options):
+    # Solves and checks every instance of the directory, options are passed to solve_it
+    from solver import solve_it
+    failures = 0
+    for name in sorted(os.listdir(data_directory)):
+        with open(os.path.join(data_directory, name), 'r') as input_data_file:
+            input_data = input_data_file.read()
+        start_time = time.time()
+        try:
+            output_data = solve_it(input_data, **options)
+            if output_data is None:
+                raise ValueError('no solution')
+            result = '%.2f' % check_solution(input_data, output_data)
+        except ValueError as error:
+            failures += 1
+            result = 'INVALID: {}'.format(error)
+        print('{} {} ({:.1f}s)'.format(name, result, time.time() - start_time))
+    return failures
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        from solver import parse_options
+        data_directory, options = parse_options(sys.argv[2:])
+        sys.exit(1 if check_directory(data_directory.strip(), **options) else 0)
+    elif len(sys.argv) > 2:
+        with open(sys.argv[1].strip(), 'r') as input_data_file:
+            input_data = input_data_file.read()
+        with open(sys.argv[2].strip(), 'r') as output_data_file:
+            output_data = output_data_file.read()
+        print('%.2f' % check_solution(input_data, output_data))
+    else:
+        print('Usage: python validator.py ./data/vrp_5_4_1 solution.txt  (solution in the solver output format)\n'
+              '       python validator.py --batch ./data [solver options]')